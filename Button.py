@@ -1,13 +1,13 @@
 from functools import cached_property
 import pygame as pg
 from pygame import Rect
-from _utils import BLACK, WHITE, sub_indices, Callable, Index2D, Surface, Any, Color, Optional
+from _utils import BLACK, WHITE, sub_indices, render_text, Callable, Index2D, Surface, Any, Color, Optional
 import inspect
 
 def mt_func(b):pass
 
 class GeneralButton:
-    just_done: dict[str,Any] = {x:False for x in ["click","hover","alt_click"]}
+    hovered: bool = False
     def __init__(self, draw: Callable=None, area_func: Callable=None, on_click: Callable = None, on_hover: Callable = None, on_alt_click: Callable = None, **kwargs):
         """
         @params:  
@@ -44,7 +44,6 @@ class GeneralButton:
         self.on_alt_click = on_alt_click or mt_func
 
     def __call__(self, s:Surface):
-        self.update()
         self.draw(s)
 
     def _call(self,func):
@@ -53,28 +52,20 @@ class GeneralButton:
         else:
             func()
 
-    def update(self):
-        mouse_pos = pg.mouse.get_pos()
-        if self.area_func(mouse_pos):
-            jd_copy = dict(self.just_done)
-            self.just_done["hover"]=True
-            mbttns = pg.mouse.get_pressed()
-            if mbttns[0]: # normal click
-                self.just_done["click"]=True
-                if not jd_copy["click"]:
-                    return self._call(self.on_click)
-            else:
-                self.just_done["click"]=False
-            if mbttns[1]: # alt click
-                self.just_done["alt_click"]=True
-            elif not mbttns[1]:
-                self.just_done["alt_click"]=False
-                if jd_copy["alt_click"]:
-                    return self._call(self.alt_click)
-            if not jd_copy["hover"]: # neither click
+    def handle_event(self,event:pg.event.Event):
+        """ Handles the mouse events routed to the button by its state """
+        if event.type == pg.MOUSEMOTION:
+            hovered = bool(self.area_func(event.pos))
+            if hovered and not self.hovered:
+                self.hovered = hovered
                 return self._call(self.on_hover)
-        else:
-            self.just_done["hover"] = False
+            self.hovered = hovered
+        elif event.type == pg.MOUSEBUTTONDOWN and self.area_func(event.pos):
+            self.hovered = True
+            if event.button == pg.BUTTON_LEFT: # normal click
+                return self._call(self.on_click)
+            elif event.button == pg.BUTTON_RIGHT: # alt click
+                return self._call(self.on_alt_click)
     
     def _draw(self,s:Surface): pass
 
@@ -139,7 +130,7 @@ class TextButton(GeneralButton):
 
     def style_dict(self)->dict[str,Any]:
         style = {k:self.__getattribute__(k) for k in self.non_defaults|self.defaults}
-        if self.just_done["hover"]:
+        if self.hovered:
             style.update(self.hover_style)
         return style
 
@@ -148,7 +139,7 @@ class TextButton(GeneralButton):
         style: dict[str,Any] = self.style_dict()
         pg.draw.rect(s, style["bg_color"], self.rect, border_radius = style["border_radius"])
         pg.draw.rect(s, style["border_color"], self.rect, style["border"], style["border_radius"])
-        text_render = self.font.render(self.text, True, style["text_color"])
+        text_render = render_text(self.font, self.text, style["text_color"])
         text_rect = text_render.get_rect(center = self.rect.center)
         s.blit(text_render,text_rect)
     
@@ -172,6 +163,7 @@ def main():
                 return
             elif e.type == pg.KEYDOWN and e.key == pg.K_ESCAPE:
                 return
+            tButton.handle_event(e)
         screen.fill(WHITE)
         tButton(screen)
         pg.display.flip()
@@ -0,0 +1,110 @@
+"""Minlex canonical form of 9x9 puzzles.
+
+Two puzzles are equivalent if a transform of Transform.py (digit relabeling, line swaps within bands and stacks,
+band and stack swaps, transpose) turns one into the other. The canonical form is the lexicographically smallest literal
+of all transforms of a puzzle, empty cells counting as 0, so equivalent puzzles have the same canonical form.
+
+The literal is built line by line (a line is 9 consecutive cells of the literal, board[x]). Every line is picked greedily
+among the lines its band allows, keeping every choice that ties for the smallest line. Digits are relabeled 1, 2, 3...
+in order of appearance. The columns aren't permuted one order at a time: within a stack, columns stay interchangeable
+until a line puts different values on them, so the empty cells of a line are moved left in one step.
+Only the stack orders and the label order of digits appearing in the same block for the first time branch."""
+from itertools import permutations, product
+from typing import Sequence
+
+# the columns of a state: its 3 stacks in order, each a tuple of blocks in order, each block a tuple of columns
+# whose order is still free. Columns are only fixed once a line puts different values on them
+Stacks = tuple[tuple[tuple[int,...],...],...]
+_START: list[Stacks] = [tuple(((3*s,3*s+1,3*s+2),) for s in order) for order in permutations(range(3))]
+
+def _arrange(line:Sequence[int],stacks:Stacks,labels:list[int],count:int)->list[int]:
+    """ The smallest form of line under the column freedom of stacks: empty cells first in every block,
+    then the labeled digits by label, then the digits without a label, which get the next labels in order """
+    result = []
+    for stack in stacks:
+        for block in stack:
+            if len(block) == 1:
+                d = line[block[0]]
+                if d and not labels[d]:
+                    count += 1
+                    result.append(count)
+                else:
+                    result.append(labels[d])
+                continue
+            values = []
+            new = 0
+            for j in block:
+                d = line[j]
+                if d and not labels[d]: new += 1
+                else: values.append(labels[d])
+            values.sort()
+            result += values
+            for _ in range(new):
+                count += 1
+                result.append(count)
+    return result
+
+def _refine(line:Sequence[int],stacks:Stacks,labels:list[int],count:int)->list[tuple[Stacks,list[int],int]]:
+    """ The column freedom and labels after line was arranged by _arrange. The digits without a label
+    could take their labels in any order, every order is one alternative """
+    fixed: list[list[tuple]] = [] # per stack: the refined blocks, ("new", columns) for the digits without a label
+    for stack in stacks:
+        blocks: list[tuple] = []
+        for block in stack:
+            zeros = tuple(j for j in block if not line[j])
+            if zeros: blocks.append(zeros)
+            blocks += [(j,) for _,j in sorted((labels[line[j]],j) for j in block if line[j] and labels[line[j]])]
+            new = tuple(j for j in block if line[j] and not labels[line[j]])
+            if len(new) == 1: blocks.append(new)
+            elif new: blocks.append(("new",new))
+        fixed.append(blocks)
+    groups = [block[1] for blocks in fixed for block in blocks if block[0] == "new"]
+    alternatives = []
+    for orders in product(*(permutations(group) for group in groups)):
+        chosen = iter(orders)
+        new_stacks = tuple(tuple(block for b in blocks for block in ([(j,) for j in next(chosen)] if b[0] == "new" else [b]))
+            for blocks in fixed)
+        new_labels,new_count = labels[:],count
+        for stack in new_stacks:
+            for block in stack:
+                d = line[block[0]]
+                if len(block) == 1 and d and not new_labels[d]:
+                    new_count += 1
+                    new_labels[d] = new_count
+        alternatives.append((new_stacks,new_labels,new_count))
+    return alternatives
+
+def canonical_cells(cells:Sequence[int])->list[int]:
+    """ The minlex form of a flat 9x9 puzzle (index x*9+y) """
+    lines = [tuple(cells[x*9:x*9+9]) for x in range(9)]
+    grids = (lines,[tuple(column) for column in zip(*lines)]) # the board and its transpose
+    # a state is a grid, the lines used so far, the column freedom and the labels of the digits (labels[digit], 0: none yet)
+    states: list[tuple] = [(grid,(),stacks,[0]*10,0) for grid in grids for stacks in _START]
+    canonical: list[int] = []
+    for pos in range(9):
+        best = None
+        candidates_of = []
+        for state in states:
+            grid,used,stacks,labels,count = state
+            if pos%3: # the rest of the band of the last line
+                band = used[-1]//3
+                candidates = [r for r in range(3*band,3*band+3) if r not in used]
+            else: # the first line of a new band
+                bands = {r//3 for r in used}
+                candidates = [r for r in range(9) if r//3 not in bands]
+            for r in candidates:
+                result = _arrange(grid[r],stacks,labels,count)
+                if best is None or result < best:
+                    best = result
+                    candidates_of = [(state,r)]
+                elif result == best:
+                    candidates_of.append((state,r))
+        states = [(grid,used+(r,),*alternative) for (grid,used,stacks,labels,count),r in candidates_of
+            for alternative in _refine(grid[r],stacks,labels,count)]
+        canonical.extend(best) # type: ignore
+    return canonical
+
+def canonical(lit:str)->str:
+    """ The minlex literal of a 9x9 literal, "." for empty cells like all literals """
+    from CompactBoard import CompactBoard
+    return CompactBoard(bytes(canonical_cells(CompactBoard.from_literal(lit).cells))).to_literal()
@@ -0,0 +1,75 @@
+from _utils import Board, Index2D, Iterable, Optional
+
+_INVALID = 0xFF
+_FROM_LITERAL = bytes(num-48 if 48<=num<=57 else 0 if num==46 else _INVALID for num in range(256)) # "." and "0" are empty
+_TO_LITERAL = bytes(48+num if 0<num<=9 else 46 for num in range(256))
+
+class CompactBoard:
+    """ A board stored as a flat bytearray of 81 cells (index x*9+y, 0 is empty).
+    It has the same accessors as SudokuBoard but costs a fraction of the memory of a Board (list of lists)
+    and copying it is a single buffer copy. """
+    __slots__ = ("cells",)
+    def __init__(self,cells:Optional[bytes|bytearray]=None):
+        self.cells = bytearray(cells) if cells is not None else bytearray(81)
+        assert len(self.cells)==81
+    @classmethod
+    def from_literal(cls,lit:str|bytes)->"CompactBoard":
+        """ Parses a literal like SudokuBoard.parse_literal. The conversion is one translate call over the whole string """
+        if isinstance(lit,str):lit=lit.encode("ascii")
+        cells = bytearray(lit.strip()).translate(_FROM_LITERAL)
+        if len(cells)!=81 or _INVALID in cells:
+            raise ValueError(f"Invalid sudoku literal: {lit!r}")
+        board = cls.__new__(cls)
+        board.cells = cells
+        return board
+    def to_literal(self)->str:
+        """ The inverse of from_literal, equal to SudokuBoard.print_literal """
+        return self.cells.translate(_TO_LITERAL).decode("ascii")
+    @classmethod
+    def from_board(cls,board:Board)->"CompactBoard":
+        return cls(bytes(num for column in board for num in column))
+    def to_board(self)->Board:
+        return [list(self.cells[x*9:x*9+9]) for x in range(9)]
+    def copy(self)->"CompactBoard":
+        return CompactBoard(self.cells)
+    __copy__ = copy
+    def __eq__(self,other)->bool:
+        return isinstance(other,CompactBoard) and self.cells==other.cells
+    def __repr__(self)->str:
+        return f"CompactBoard({self.to_literal()!r})"
+    def get_number(self,position:Index2D)->int:
+        x,y = position
+        return self.cells[x*9+y]
+    def put_number(self,number:int,position:Index2D)->"CompactBoard":
+        x,y = position
+        self.cells[x*9+y]=number
+        return self
+    def release_number(self,position:Index2D)->"CompactBoard":
+        return self.put_number(0,position)
+    def field_occupied(self,position:Index2D)->bool:
+        return bool(self.get_number(position))
+    def findNumber(self,number:int)->Iterable[Index2D]:
+        i = self.cells.find(number)
+        while i!=-1:
+            yield divmod(i,9)
+            i = self.cells.find(number,i+1)
+    def iterate_board(self,*,withEmpty:bool=False)->Iterable[tuple[int,int,int]]:
+        """withEmpty (key-word-only): If True iterates over the whole board, otherwise skips all empty fields"""
+        for i,num in enumerate(self.cells):
+            if withEmpty or num:yield (i//9,i%9,num)
+
+def main():
+    """ Measures the memory per board of a Board and a CompactBoard """
+    import tracemalloc
+    from SudokuBoard import SudokuBoard
+    lit = "4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......"
+    n = 10000
+    for name,make in [("Board",lambda:SudokuBoard.parse_literal(lit)),("CompactBoard",lambda:CompactBoard.from_literal(lit))]:
+        tracemalloc.start()
+        boards = [make() for _ in range(n)]
+        size,_ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name}: {size/len(boards):.0f} bytes per board")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import mmap
+import os
+import struct
+import threading
+from array import array
+from random import randrange
+from typing import Iterator
+
+class Corpus:
+    """ A puzzle file with one literal per line that is memory mapped instead of read.
+    The offsets of all puzzle lines (comments starting with # and blank lines are skipped)
+    are kept in a compact index that is stored next to the file as <path>.idx,
+    so puzzle i can be read in O(1) without ever loading the whole file. """
+    _header = struct.Struct("<4sBcxxQQQ") # magic, version, array typecode, source size, source mtime, count
+    _magic = b"SIDX"
+    _version = 1
+    _opened: dict[str,"Corpus"] = {}
+    _opened_lock = threading.Lock() # the loader threads and the puzzle queue open files at the same time
+
+    @classmethod
+    def open(cls,path:str)->"Corpus":
+        """ Returns the shared Corpus of a path """
+        with cls._opened_lock:
+            if path not in cls._opened:
+                cls._opened[path] = cls(path)
+            return cls._opened[path]
+
+    def __init__(self,path:str):
+        self.path = path
+        self.index_path = path+".idx"
+        with open(path,"rb") as f:
+            stat = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) if stat.st_size else b""
+        self.offsets = self._load_index(stat) or self._build_index(stat)
+
+    def _load_index(self,stat:os.stat_result)->array|None:
+        try:
+            with open(self.index_path,"rb") as f:
+                magic,version,typecode,size,mtime,count = self._header.unpack(f.read(self._header.size))
+                if (magic,version,size,mtime) != (self._magic,self._version,stat.st_size,stat.st_mtime_ns):
+                    return None
+                offsets = array(typecode.decode())
+                offsets.fromfile(f,count)
+                return offsets
+        except (OSError,struct.error,EOFError,ValueError):
+            return None
+
+    def _build_index(self,stat:os.stat_result)->array:
+        offsets = array("I" if stat.st_size < 2**32 else "Q")
+        mm, start, size = self.mm, 0, stat.st_size
+        while start < size:
+            end = mm.find(b"\n",start)
+            if end == -1: end = size
+            line = mm[start:end]
+            if line.strip() and not line.startswith(b"#"):
+                offsets.append(start)
+            start = end+1
+        try:
+            tmp_path = self.index_path+".tmp"
+            with open(tmp_path,"wb") as f:
+                f.write(self._header.pack(self._magic,self._version,offsets.typecode.encode(),stat.st_size,stat.st_mtime_ns,len(offsets)))
+                offsets.tofile(f)
+            os.replace(tmp_path,self.index_path)
+        except OSError: # a read only data directory just means we have to build the index again next time
+            pass
+        return offsets
+
+    def __len__(self)->int:
+        return len(self.offsets)
+
+    def __getitem__(self,i:int)->str:
+        start = self.offsets[i]
+        end = self.mm.find(b"\n",start)
+        return self.mm[start:end if end!=-1 else len(self.mm)].strip().decode()
+
+    def __iter__(self)->Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def random(self)->str:
+        """ A random puzzle of the corpus """
+        return self[randrange(len(self))]
+
+    def close(self):
+        if isinstance(self.mm,mmap.mmap):
+            self.mm.close()
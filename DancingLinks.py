@@ -0,0 +1,150 @@
+"""Algorithm X with Dancing Links over the 324 column exact cover matrix of Sudoku.
+
+Columns: 81 cells, then 81 column/digit, 81 row/digit and 81 box/digit constraints (units in the order of Solver.UNITS).
+Matrix row r = i*9 + d-1 places digit d in the flat cell i (x*9+y).
+The node arrays are built once and copied back into the same lists for every puzzle."""
+import threading
+from typing import Optional, Sequence
+
+N_COLUMNS = 324
+ROOT = 0
+
+def _build_matrix()->tuple[list[int],...]:
+    n = 1+N_COLUMNS+729*4
+    L,R,U,D,C,ROW = [0]*n,[0]*n,[0]*n,[0]*n,[0]*n,[-1]*n
+    S = [0]*(N_COLUMNS+1)
+    for c in range(N_COLUMNS+1): # headers, 0 is the root
+        L[c],R[c] = (c-1) % (N_COLUMNS+1),(c+1) % (N_COLUMNS+1)
+        U[c] = D[c] = C[c] = c
+    node = N_COLUMNS+1
+    for r in range(729):
+        i,d = divmod(r,9)
+        x,y = divmod(i,9)
+        first = node
+        for k,c in enumerate((1+i,1+81+x*9+d,1+162+y*9+d,1+243+(y//3*3+x//3)*9+d)):
+            C[node],ROW[node] = c,r
+            U[node],D[node] = U[c],c
+            D[U[c]] = node
+            U[c] = node
+            S[c] += 1
+            L[node] = node-1 if k else first+3
+            R[node] = node+1 if k < 3 else first
+            node += 1
+    return L,R,U,D,C,ROW,S
+
+_TEMPLATE = _build_matrix()
+
+class DancingLinks:
+    """ One reusable exact cover matrix. Not thread safe, use shared() to get the matrix of the current thread """
+    _local = threading.local()
+
+    @classmethod
+    def shared(cls)->"DancingLinks":
+        if not hasattr(cls._local,"dlx"):
+            cls._local.dlx = cls()
+        return cls._local.dlx
+
+    def __init__(self):
+        L,R,U,D,C,ROW,S = _TEMPLATE
+        self.L,self.R,self.U,self.D,self.S = list(L),list(R),list(U),list(D),list(S)
+        self.C,self.ROW = C,ROW # never change
+        self.solution: list[int] = []
+
+    def _reset(self):
+        L,R,U,D,_,_,S = _TEMPLATE
+        self.L[:] = L; self.R[:] = R; self.U[:] = U; self.D[:] = D; self.S[:] = S
+
+    def _cover(self,c:int):
+        L,R,U,D,C,S = self.L,self.R,self.U,self.D,self.C,self.S
+        L[R[c]] = L[c]; R[L[c]] = R[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                U[D[j]] = U[j]; D[U[j]] = D[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def _uncover(self,c:int):
+        L,R,U,D,C,S = self.L,self.R,self.U,self.D,self.C,self.S
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                U[D[j]] = j; D[U[j]] = j
+                j = L[j]
+            i = U[i]
+        L[R[c]] = c; R[L[c]] = c
+
+    def load(self,cells:Sequence[int])->bool:
+        """ Resets the matrix and selects the rows of the givens. Returns False if two givens collide """
+        self._reset()
+        self.solution = []
+        covered = bytearray(N_COLUMNS+1)
+        for i,num in enumerate(cells):
+            if num:
+                node = N_COLUMNS+1+(i*9+num-1)*4
+                for j in range(node,node+4):
+                    c = self.C[j]
+                    if covered[c]: return False
+                    covered[c] = 1
+                    self._cover(c)
+                self.solution.append(i*9+num-1)
+        return True
+
+    def _search(self,limit:int,found:list[list[int]])->int:
+        R,D,S,C = self.R,self.D,self.S,self.C
+        if R[ROOT] == ROOT:
+            found.append(list(self.solution))
+            return 1
+        best,size = ROOT,730
+        c = R[ROOT]
+        while c != ROOT: # the column with the fewest rows
+            if S[c] < size:
+                best,size = c,S[c]
+                if size < 2: break
+            c = R[c]
+        if not size: return 0
+        self._cover(best)
+        count = 0
+        r = D[best]
+        while r != best and count < limit:
+            self.solution.append(self.ROW[r])
+            j = R[r]
+            while j != r:
+                self._cover(C[j]); j = R[j]
+            count += self._search(limit-count,found)
+            j = self.L[r]
+            while j != r:
+                self._uncover(C[j]); j = self.L[j]
+            self.solution.pop()
+            r = D[r]
+        self._uncover(best)
+        return count
+
+    def solutions(self,cells:Sequence[int],limit:int)->list[list[int]]:
+        """ Up to limit solutions of the flat board as flat lists """
+        found: list[list[int]] = []
+        if self.load(cells):
+            self._search(limit,found)
+        result = []
+        for rows in found:
+            solution = [0]*81
+            for r in rows:
+                i,d = divmod(r,9)
+                solution[i] = d+1
+            result.append(solution)
+        return result
+
+    def count_solutions(self,cells:Sequence[int],limit:int=2)->int:
+        """ Counts the solutions of the flat board, stopping at limit """
+        if not self.load(cells): return 0
+        return self._search(limit,[])
+
+def count_solutions(cells:Sequence[int],limit:int=2)->int:
+    return DancingLinks.shared().count_solutions(cells,limit)
+
+def solve(cells:Sequence[int])->Optional[list[int]]:
+    return next(iter(DancingLinks.shared().solutions(cells,1)),None)
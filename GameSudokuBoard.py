@@ -1,138 +1,329 @@
 from SudokuBoard import SudokuBoard
 import pygame as pg
-from _utils import WHITE, BLACK, board_like , range_square, get_from_set, sub_indices, scale_image_to_width, Callable, Iterable, Surface, KeyCodeIndex, Color, Index2D, Board, Font, Optional
+from array import array
+import Rating
+import Solver
+from Rating import Step
+from UndoLog import Delta, UndoLog
+from _utils import WHITE, BLACK, render_text, range_square, sub_indices, scale_image_to_width, Callable, Iterable, Surface, Color, Index2D, Board, Font, Optional
 #https://stackoverflow.com/questions/6339057/draw-a-transparent-rectangles-and-polygons-in-pygame
 
 class GameSudokuBoard(SudokuBoard):
-    def __init__(self, board:Optional[Board]=None, pos:Optional[Index2D]=None, size:Optional[int]=None, text_size:Optional[int]=None, font:Optional[Font]=None, color:Optional[Color]=None, text_color:Optional[Color]=None, bg_color:Optional[Color]=None, sel_color:Optional[Color]=None, on_finished:Optional[Callable]=None):
-        "on_finished: function to call when finished"
+    def __init__(self, board:Optional[Board]=None, pos:Optional[Index2D]=None, size:Optional[int]=None, text_size:Optional[int]=None, font:Optional[Font]=None, color:Optional[Color]=None, text_color:Optional[Color]=None, bg_color:Optional[Color]=None, sel_color:Optional[Color]=None, on_finished:Optional[Callable]=None, solution:Optional[Board]=None):
+        """on_finished: function to call when finished. solution: the solution of the board if already known (otherwise it is solved when needed).
+        text_size is the size of the numbers on a 9x9 board, the numbers of bigger boards shrink with their fields"""
         super().__init__(board)
         self.draw_pos = max(pos[0],3),max(pos[1],3) or (3,3)
         self.size = size or self.default_size
         self.text_size = text_size or 50
-        self.font = font or pg.font.Font(None, self.text_size)
+        self.font = font or self.default_font(self.text_size*9//self.n)
         self.color = color or BLACK
         self.text_color = text_color or BLACK
         self.bg_color = bg_color or WHITE
         self.sel_color = sel_color or (160,160,160)
         self.on_finished = on_finished or (lambda self: print("On finished not defined"))
-        self.numbers: list[Surface] = [self.font.render(str(i+1),True,self.text_color) for i in range(9)]
-        self.note_numbers=[scale_image_to_width(s,self.size/60) for s in self.numbers]
+        self.numbers,self.note_numbers = self.glyphs()
         self.selected_field: Optional[Index2D]=None
         self.selected_num = 0
         self.preset:list[Index2D] = [(x,y) for x,column in enumerate(self.board) for y,num in enumerate(column) if num]
-        self.notes:list[list[set[int]]] = board_like(lmbda=lambda x,y:set())
+        self.notes = array("H" if self.n<=16 else "L",[0]*self.geometry.cells) # flat note masks (index x*n+y, bit k-1 for note k)
+        self._solution = solution and [num for column in solution for num in column]
+        self.history = UndoLog(self.flat())
+        self.changes = 0 # counts the changes of numbers and notes
     def put_number(self,number: int, pos: Index2D): 
-        super().put_number(number,pos)
-        self.set_notes(set(),pos)
-    def set_notes(self,notes: set[int],pos: Index2D):
+        """Puts number on a field, clears its notes and removes number from the notes of its peers (one action)"""
         x,y = pos
-        self.notes[x][y] = notes
-    def get_notes(self,pos: Index2D):
+        i = x*self.n+y
+        with self.history.group():
+            self._change(i,number,0)
+            if number:
+                self._clear_peer_notes(i,self.geometry.bits[number])
+    def _clear_peer_notes(self,i:int,bit:int):
+        notes,board,n = self.notes,self.board,self.n
+        for p in self.geometry.peers[i]:
+            if notes[p] & bit:
+                self._change(p,board[p//n][p%n],notes[p] & ~bit)
+    def _change(self,i:int,number:int,notes:int,record:bool=True):
+        """Sets the number and the note mask of the field with the flat index i. Every change goes through here and is recorded in the history"""
+        x,y = divmod(i,self.n)
+        old = self.board[x][y]
+        old_notes = self.notes[i]
+        if number==old and notes==old_notes: return
+        self.changes += 1
+        if record:
+            self.history.record(Delta(i,old,number,old_notes,notes))
+        self.notes[i] = notes
+        if number==old: return
+        super().put_number(number,(x,y))
+        if self._hint_cand is not None:
+            if old: # the eliminations of earlier hints may have depended on the removed number
+                self._hint_cand = None
+            else:
+                self._hint_cand[i] = 0
+                bit = self.geometry.bits[number]
+                for p in self.geometry.peers[i]:
+                    self._hint_cand[p] &= ~bit
+    def note_masks(self)->list[int]:
+        """The flat note masks of all fields (bit k-1 for note k)"""
+        return self.notes.tolist()
+    def restore(self,cells:Iterable[int],notes:Iterable[int]):
+        """Puts the numbers and notes of a saved position on the board, which has to hold only the preset numbers. The history starts at the restored position"""
+        for i,(num,mask) in enumerate(zip(cells,notes)):
+            if divmod(i,self.n) not in self.preset:
+                self._change(i,num,mask,record=False)
+        self.history = UndoLog(self.flat(),self.note_masks())
+    def solution(self)->Optional[list[int]]:
+        """The flat solution of the preset numbers"""
+        if self._solution is None:
+            givens = [0]*self.geometry.cells
+            for x,y in self.preset:
+                givens[x*self.n+y] = self.board[x][y]
+            self._solution = Solver.solve(givens)
+        return self._solution
+    _hint_cand: Optional[Rating.Candidates] = None
+    def hint(self)->Optional[Step]:
+        """The next step towards the solution as a Rating.Step with flat cell indices (x*n+y):
+        the conflicting or wrong numbers ("Conflict"/"Mistake") if there are any,
+        otherwise the easiest deduction of Rating.TECHNIQUES or a "Trial" placement if none applies. None if the board is solved.
+        The techniques only know 9x9 boards, bigger ones always get a "Trial" placement.
+        The candidates are kept between calls and updated by put_number, so the eliminations of a hint are not repeated by the next one"""
+        if self.duplicates:
+            return Step("Conflict",[],[],[x*self.n+y for x,y in self.conflicts()])
+        solution = self.solution()
+        cells = self.flat()
+        if solution is not None:
+            wrong = [i for i,num in enumerate(cells) if num and num!=solution[i]]
+            if wrong:
+                return Step("Mistake",[],[],wrong)
+        if self.n!=9:
+            empty = [i for i,num in enumerate(cells) if not num]
+            if not empty or solution is None: return None
+            i = min(empty,key=lambda i:self.candidate_mask(divmod(i,self.n)).bit_count())
+            return Step("Trial",[(i,solution[i])],[],[])
+        if self._hint_cand is None:
+            self._hint_cand = Rating.candidates(cells)
+        cand = self._hint_cand
+        step = Rating.next_step(cells,cand)
+        if step is None:
+            empty = [i for i,num in enumerate(cells) if not num]
+            if not empty or solution is None: return None
+            i = min(empty,key=lambda i:Solver.POPCOUNT[cand[i]])
+            return Step("Trial",[(i,solution[i])],[],[])
+        for i,mask in step.eliminations:
+            cand[i] &= ~mask
+        return step
+    def show_hint(self)->Optional[Step]:
+        """Selects the cell a hint is about: the placed cell, the first wrong number or the first supporting cell"""
+        step = self.hint()
+        if step is not None:
+            if step.placements:
+                i,num = step.placements[0]
+            else:
+                i = (step.support or [step.eliminations[0][0]])[0]
+                num = self.board[i//self.n][i%self.n]
+            self.selected_field = divmod(i,self.n)
+            self.selected_num = num
+        return step
+    def set_notes(self,notes: int,pos: Index2D):
+        """Sets the note mask of a field"""
+        x,y = pos
+        self._change(x*self.n+y,self.board[x][y],notes)
+    def undo(self)->bool:
+        """Reverts the last action (all changes of one input event). Returns whether there was one"""
+        deltas = self.history.undo()
+        for delta in deltas:
+            self._change(delta.cell,delta.old,delta.old_notes,record=False)
+        return bool(deltas)
+    def redo(self)->bool:
+        """Applies the last undone action again. Returns whether there was one"""
+        deltas = self.history.redo()
+        for delta in deltas:
+            self._change(delta.cell,delta.new,delta.new_notes,record=False)
+        return bool(deltas)
+    def get_notes(self,pos: Index2D)->int:
+        """The note mask of a field"""
         x,y = pos
-        return self.notes[x][y]
+        return self.notes[x*self.n+y]
     def get_field_rect(self,pos:Index2D)->pg.rect.Rect:
         x,y = pos
         posx,posy=self.draw_pos
-        sboxsize=self.size//9
+        sboxsize=self.size//self.n
         return pg.rect.Rect(posx+x*sboxsize,posy+y*sboxsize,sboxsize,sboxsize)
     def _set_size(self,size:int):
-        if not size%9==0:
-            self._size = round(size/9)*9
-            #print (f"Size ({size}) has to be divisible by 9. Was rounded to the closest number divisable by 9 ({self.size})")
+        if not size%self.n==0:
+            self._size = round(size/self.n)*self.n
+            #print (f"Size ({size}) has to be divisible by n. Was rounded to the closest number divisable by n ({self.size})")
         else: 
             self._size=size
     def _del_size(self): self._size=self.default_size
     default_size = 270
     size=property(lambda self:self._size,_set_size,_del_size,"Size of the board.")
-    key_codes:KeyCodeIndex = [(i,pg.key.key_code(str(i))) for i in range(0,10)]
-    just_pressed_keys={k:False for k in range(512)}
+    key_numbers:dict[int,int] = {**{pg.K_0+i:i for i in range(10)},**{pg.K_KP0+i:i for i in range(10)}}
     def update(self):
         if self.checkFinished():
             self.on_finished()
-        pressed_keys=pg.key.get_pressed()
-        if self.assure_single_key(pressed_keys,pg.K_m):
+    def handle_event(self,event:pg.event.Event):
+        """Handles the input events routed to the board by its state. The changes of one event are undone together"""
+        with self.history.group():
+            self._handle_event(event)
+    def _handle_event(self,event:pg.event.Event):
+        if event.type == pg.KEYDOWN:
+            self.key_down(event.key,event.mod)
+        elif event.type == pg.MOUSEBUTTONDOWN:
+            if event.button == pg.BUTTON_LEFT:
+                self.mouse_click(event.pos)
+            elif event.button in (pg.BUTTON_MIDDLE,pg.BUTTON_RIGHT):
+                self.alternate_mouse_click(event.pos)
+        elif event.type == pg.MOUSEMOTION and event.buttons[0]: # dragging moves the selection
+            self.mouse_click(event.pos)
+    def key_down(self,key:int,mod:int=0):
+        typing,self._typing = self._typing,None
+        if key == pg.K_m:
             self.cheat()
+            return
+        if key == pg.K_h:
+            self.show_hint()
+            return
+        if mod & pg.KMOD_CTRL and key in (pg.K_z,pg.K_y):
+            if key == pg.K_y or mod & pg.KMOD_SHIFT:
+                self.redo()
+            else:
+                self.undo()
+            return
+        num = self.key_numbers.get(key)
         if not (self.selected_field is None or self.selected_field in self.preset):
-            if pressed_keys[pg.K_DELETE]:
+            if key == pg.K_DELETE:
                 self.put_number(0,self.selected_field)
-            else:
-                if pg.key.get_mods() & pg.KMOD_CTRL: #control input
-                    def key_click():
-                        if num:
-                            self.get_notes(self.selected_field).symmetric_difference_update({num})
-                        else:
-                            self.get_notes(self.selected_field).clear()
+            elif num is not None:
+                field,note = self.selected_field,bool(mod & pg.KMOD_CTRL)
+                combined = (self.n>9 and typing and typing[:3]==(field,self.changes,note)
+                    and 0<(typed:=typing[4]*10+num)<=self.n)
+                if combined:
+                    # the second digit of a number above 9 replaces the first one and takes back its action if it made one
+                    if typing[3]:
+                        self.undo()
+                    num = typed
+                changes = self.changes
+                if note: #control input
+                    self.set_notes(self.get_notes(field)^self.geometry.bits[num] if num else 0,field)
                 else: # normal input
-                    def key_click():
-                        self.put_number(num,self.selected_field)
-                        self.selected_num = num
-                for num,key in self.key_codes:
-                    if self.assure_single_key(pressed_keys,key):
-                        key_click()
-        else: 
-            for num,key in self.key_codes:
-                if self.assure_single_key(pressed_keys,key):
-                    self.selected_num=num
-        mb=pg.mouse.get_pressed()
-        if mb[0]:
-            self.mouse_click(pg.mouse.get_pos())
-        elif any(mb):
-            self.alternate_mouse_click(pg.mouse.get_pos())
+                    self.put_number(num,field)
+                    self.selected_num = num
+                if not combined and num:
+                    self._typing = field,self.changes,note,self.changes!=changes,num
+        elif num is not None:
+            self.selected_num=num
+    # the number or note just typed that may get a second digit: its field, the change count after it, whether it was a note,
+    # whether it made an action and the digit. A second digit only counts as long as nothing changed in between
+    _typing: Optional[tuple[Index2D,int,bool,bool,int]] = None
+    _fonts: dict[int,Font] = {}
+    @classmethod
+    def default_font(cls,text_size:int)->Font:
+        """The default font of a text size, shared by all boards so their glyphs are too"""
+        if text_size not in cls._fonts:
+            cls._fonts[text_size]=pg.font.Font(None,text_size)
+        return cls._fonts[text_size]
+    _glyphs: dict[tuple,tuple[list[Surface],list[Surface]]] = {}
+    def glyphs(self)->tuple[list[Surface],list[Surface]]:
+        """The rendered numbers and the scaled note numbers. Rendered once per font, color and size"""
+        key=(self.font,tuple(self.text_color),self.size,self.n)
+        if key not in self._glyphs:
+            numbers=[render_text(self.font,str(i+1),self.text_color) for i in range(self.n)]
+            # a note gets 45% of the width of its slot per digit (the slots are box x box in a field)
+            slot=self.size/(self.n*self.geometry.box)
+            self._glyphs[key]=numbers,[scale_image_to_width(s,slot*0.45*len(str(i+1))) for i,s in enumerate(numbers)]
+        return self._glyphs[key]
+    _grid_layers: dict[tuple,Surface] = {}
+    def grid_layer(self)->Surface:
+        """The lines of the board on a transparent surface with (0,0) at draw_pos-(3,3). Rendered once per size and color"""
+        key=(self.size,tuple(self.color),self.n)
+        if key not in self._grid_layers:
+            box=self.geometry.box
+            sboxsize=self.size//self.n
+            mboxsize=self.size//box
+            layer=pg.surface.Surface((self.size+6,self.size+6),pg.SRCALPHA)
+            for x,y in range_square(self.n):
+                pg.draw.rect(layer,self.color,(3+x*sboxsize,3+y*sboxsize,sboxsize,sboxsize),1)
+            # the bigger boxes
+            for x,y in range_square(box):
+                pg.draw.rect(layer,self.color,(2+x*mboxsize,2+y*mboxsize,mboxsize+2,mboxsize+2),3)
+            #frame the whole board
+            pg.draw.rect(layer,self.color,(0,0,self.size+6,self.size+6),2)
+            self._grid_layers[key]=layer
+        return self._grid_layers[key]
+    _layer: Optional[Surface] = None
+    _layer_key: tuple = ()
+    def _cell_state(self,pos:Index2D)->tuple:
+        """Everything the look of a field depends on"""
+        num=self.get_number(pos)
+        return (num, None if num else self.get_notes(pos), pos==self.selected_field, bool(num) and num==self.selected_num)
+    def _render_cell(self,pos:Index2D,state:tuple):
+        num,notes,selected,highlighted=state
+        posx,posy=self.draw_pos
+        sboxsize=self.size//self.n
+        box=self.geometry.box
+        rect=self.get_field_rect(pos).move(3-posx,3-posy)
+        layer=self._layer
+        layer.fill(self.sel_color if selected else self.bg_color,rect)
+        if num:
+            if highlighted:
+                # draw a gray background for all boxes of same number as selected
+                layer.blit(self._highlight,rect)
+            text=self.numbers[num-1]
+            layer.blit(text,text.get_rect(center=(rect.x+sboxsize/2,rect.y+sboxsize/2)))
+        else: #draw notes in a box x box layout
+            slot=sboxsize/box
+            while notes:
+                bit=notes & -notes
+                notes^=bit
+                inote=bit.bit_length()-1
+                text=self.note_numbers[inote]
+                center_pos=(rect.x+inote%box*slot+slot/2,rect.y+slot/9+inote//box*slot+slot/2)
+                layer.blit(text,text.get_rect(center=center_pos))
+        layer.blit(self.grid_layer(),rect,rect)
+    def _refresh_layer(self):
+        """Redraws the fields that changed since the last call onto the board layer and remembers their rects"""
+        key=(self.size,tuple(self.color),tuple(self.bg_color),tuple(self.sel_color),self.draw_pos)
+        if self._layer is None or key!=self._layer_key:
+            sboxsize=self.size//self.n
+            self._layer_key=key
+            self._layer=pg.surface.Surface((self.size+6,self.size+6))
+            self._layer.fill(self.bg_color)
+            self._layer.blit(self.grid_layer(),(0,0))
+            self._highlight=pg.surface.Surface((sboxsize,sboxsize))
+            self._highlight.set_alpha(120)
+            self._highlight.fill(self.sel_color)
+            self._drawn:list[Optional[tuple]]=[None]*self.geometry.cells
+            posx,posy=self.draw_pos
+            self._dirty=[pg.rect.Rect(posx-3,posy-3,self.size+6,self.size+6)]
+        n=self.n
+        for x,y in range_square(n):
+            state=self._cell_state((x,y))
+            if state!=self._drawn[x*n+y]:
+                self._render_cell((x,y),state)
+                self._drawn[x*n+y]=state
+                self._dirty.append(self.get_field_rect((x,y)))
+    def changed_rects(self)->list[pg.rect.Rect]:
+        """The screen rects that changed since the last call. Drawing only has to update these on a screen that still shows the last frame"""
+        self._refresh_layer()
+        rects,self._dirty=self._dirty,[]
+        return rects
     def draw(self,surface:Surface):
-        """Draws the board to the given surface"""
+        """Draws the board to the given surface. Only changed fields are rendered again, the rest comes from the cached board layer"""
+        self._refresh_layer()
         posx,posy=self.draw_pos
-        sboxsize=self.size//9
-        mboxsize=self.size//3
-        #draw background color
-        pg.draw.rect(surface,self.bg_color, (posx,posy,self.size,self.size))
-        #draw selected field color
-        if self.selected_field is not None:
-            pg.draw.rect(surface,self.sel_color, self.get_field_rect(self.selected_field))
-        #draw sudoku fields and number
-        for x,y,num in self.iterate_board(withEmpty=True):
-            rect=self.get_field_rect((x,y))
-            draw_x,draw_y,width,height=rect
-            if num:
-                if num == self.selected_num:
-                    # draw a gray background for all boxes of same number as selected
-                    trans_rect = pg.surface.Surface((width,height))
-                    trans_rect.set_alpha(120)
-                    trans_rect.fill(self.sel_color)
-                    surface.blit(trans_rect,(draw_x,draw_y))
-                text=self.numbers[num-1]
-                text_rect=text.get_rect(center=(draw_x+sboxsize/2,draw_y+sboxsize/2))
-                surface.blit(text,text_rect)
-            else: #draw notes
-                for note in self.get_notes((x,y)):
-                    inote=note-1
-                    text=self.note_numbers[inote]
-                    center_pos=(draw_x+inote%3*sboxsize/3+sboxsize/6,draw_y+sboxsize/27+inote//3*sboxsize/3+sboxsize/6)
-                    text_rect=text.get_rect(center=center_pos)
-                    surface.blit(text,text_rect)
-            pg.draw.rect(surface,self.color,rect,1)
-        # draw the bigger boxes
-        for x,y in range_square(3):
-            pg.draw.rect(surface,self.color,(posx-1+x*mboxsize,posy-1+y*mboxsize,mboxsize+2,mboxsize+2),3)
-        #frame the whole board
-        pg.draw.rect(surface,self.color,(posx-3,posy-3,self.size+6,self.size+6),2)
+        surface.blit(self._layer,(posx-3,posy-3))
     def get_index_from_pos(self,pos:Index2D)->Optional[Index2D]:
         abs_pos = sub_indices(pos,self.draw_pos)
         if all(x>=0 and x<self.size for x in abs_pos): # both coordinates have to be in the sudoku board
             posx,posy = abs_pos
-            x=int(posx/(self.size/9))
-            y=int(posy/(self.size/9))
+            x=int(posx/(self.size/self.n))
+            y=int(posy/(self.size/self.n))
             return x,y
-    def assure_single_key(self,pressed_keys,key:int)->bool:
-        if pressed_keys[key]:
-            if not self.just_pressed_keys[key]:
-                self.just_pressed_keys[key] = True
-                return True
-        else:
-            self.just_pressed_keys[key] = False
     def mouse_click(self,pos:Index2D):
         posi = self.get_index_from_pos(pos)
         self.selected_field = posi
+        self._typing = None
         if self.selected_field is not None:
             self.selected_num = self.get_number(self.selected_field)
     def alternate_mouse_click(self,pos:Index2D):
@@ -146,22 +337,34 @@ class GameSudokuBoard(SudokuBoard):
             self.fill_safe_notes(posi)
     def fill_notes(self,pos:Index2D):
         """ Fills the trivial notes of a box """
-        x,y = pos
-        notes=set(range(1,10))
-        collumn=set(self.board[x])
-        row = set(self.rows()[y])
-        box = set(list(self.boxes())[self.box_from_index(pos)])
-        self.set_notes(notes.difference(collumn.union(row.union(box))),pos)
+        self.set_notes(self.candidate_mask(pos),pos)
     def fill_safe_notes(self,pos:Index2D):
         """ Fills boxes with single naked hints"""
         notes = self.get_notes(pos)
-        fill_safe=len(notes)==1 and not self.get_number(pos)
+        fill_safe=bool(notes) and not notes & (notes-1) and not self.get_number(pos)
         if fill_safe:
-            self.put_number(get_from_set(notes),pos)
+            self.put_number(Solver.digit(notes),pos)
         return fill_safe
+    def fill_all_notes(self):
+        """ Sets the notes of every empty field to its candidates (one action) """
+        used,board,n,all_ = self.used,self.board,self.n,self.geometry.all
+        with self.history.group():
+            for i,(c,r,b) in enumerate(self.geometry.cell_units):
+                if not board[i//n][i%n]:
+                    self._change(i,0,all_ & ~(used[c]|used[r]|used[b]))
+    def fill_all_safe_notes(self)->int:
+        """ Places the number of every empty field with a single note, in field order (one action).
+        Placing removes the number from the peers' notes, so two peers never get the same number. Returns the number of placed fields """
+        placed = 0
+        notes,board,n = self.notes,self.board,self.n
+        with self.history.group():
+            for i in range(self.geometry.cells):
+                mask = notes[i]
+                if mask and not mask & (mask-1) and not board[i//n][i%n]:
+                    self.put_number(Solver.digit(mask),divmod(i,n))
+                    placed += 1
+        return placed
     def cheat(self):
-        for x,y,num in self.iterate_board(withEmpty=True):
-            if not num:
-                self.fill_notes((x,y))
-        for pos in range_square(9):
-            self.fill_safe_notes(pos)
+        with self.history.group():
+            self.fill_all_notes()
+            self.fill_all_safe_notes()
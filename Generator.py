@@ -0,0 +1,112 @@
+"""Generates uniquely solvable puzzles.
+
+    py Generator.py -n 1000 --seed 7 -o data/generated.sdks
+    py Generator.py -n 10 --box 4 -g 120 -o data/generated16.txt   # 16x16 puzzles (comma separated literals)
+
+Puzzle i of a seed always comes from its own random stream, so the output doesn't depend on the number of workers."""
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT","1")
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+from typing import Iterator, Optional
+import Solver
+from SudokuBoard import to_literal
+
+def rng_for(seed:int|str,i:int)->Random:
+    """ The random stream of puzzle i """
+    return Random(f"{seed}:{i}")
+
+def solution_grid(rng:Random,box:int=3)->list[int]:
+    """ A random full grid. The diagonal boxes don't share a unit, so any random filling of them can be completed """
+    g = Solver.geometry(box)
+    cells = [0]*g.cells
+    for k in range(box):
+        digits = list(range(1,g.n+1))
+        rng.shuffle(digits)
+        for i,num in zip(g.units[2*g.n+k*(box+1)],digits):
+            cells[i] = num
+    solution = Solver.solve(cells)
+    assert solution is not None
+    return solution
+
+def is_unique_without(cells:list[int],i:int)->bool:
+    """ Whether cells stays uniquely solvable if cell i is emptied. cells has to be uniquely solvable """
+    num = cells[i]
+    cells[i] = 0
+    used = Solver.unit_masks(cells)
+    assert used is not None
+    g = Solver.geometry_of(len(cells))
+    c,r,b = g.cell_units[i]
+    others = g.all & ~(used[c]|used[r]|used[b]) & ~g.bits[num]
+    unique = True
+    while others and unique: # any solution with another number at i would be a second solution
+        bit = others & -others
+        others ^= bit
+        cells[i] = Solver.digit(bit)
+        unique = Solver.solve(cells) is None
+    cells[i] = num
+    return unique
+
+def make_puzzle(rng:Random,givens:int=0,box:int=3)->tuple[list[int],list[int]]:
+    """ Returns a uniquely solvable puzzle and its solution.
+    Cells are removed in random order as long as the solution stays unique and there are more than givens numbers left """
+    solution = solution_grid(rng,box)
+    cells = solution[:]
+    order = list(range(len(cells)))
+    rng.shuffle(order)
+    left = len(cells)
+    for i in order:
+        if left <= givens: break
+        if is_unique_without(cells,i):
+            cells[i] = 0
+            left -= 1
+    return cells,solution
+
+def generate_range(seed:int|str,start:int,stop:int,givens:int=0,box:int=3)->list[tuple[str,str]]:
+    """ The puzzle and solution literals of the puzzles start to stop-1 """
+    return [tuple(map(to_literal,make_puzzle(rng_for(seed,i),givens,box))) for i in range(start,stop)] # type: ignore
+
+def generate(n:int,seed:int|str=0,givens:int=0,workers:Optional[int]=None,chunk_size:int=16,box:int=3)->Iterator[tuple[str,str]]:
+    """ Yields n (puzzle, solution) literal pairs in order, generated on a process pool """
+    if workers == 1:
+        for start in range(0,n,chunk_size):
+            yield from generate_range(seed,start,min(n,start+chunk_size),givens,box)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        starts = range(0,n,chunk_size)
+        for chunk in executor.map(generate_range,[seed]*len(starts),starts,[min(n,s+chunk_size) for s in starts],[givens]*len(starts),[box]*len(starts)):
+            yield from chunk
+
+def main():
+    parser = ArgumentParser(description="Generate uniquely solvable sudoku puzzles")
+    parser.add_argument("-n","--count",type=int,default=10,help="number of puzzles")
+    parser.add_argument("-s","--seed",default="0",help="seed of the random streams")
+    parser.add_argument("-g","--givens",type=int,default=0,help="stop removing numbers at this many givens (0: as few as possible)")
+    parser.add_argument("-j","--workers",type=int,help="number of processes (defaults to the number of cores)")
+    parser.add_argument("-b","--box",type=int,default=3,help="box size, 4 for 16x16 and 5 for 25x25 puzzles")
+    parser.add_argument("-o","--output",help="text file or puzzle store (.sdks, with solutions, only 9x9), defaults to stdout")
+    args = parser.parse_args()
+    from PuzzleStore import PuzzleStoreWriter, SUFFIX
+    if args.box != 3 and args.output and args.output.endswith(SUFFIX):
+        parser.error("puzzle stores only hold 9x9 puzzles")
+    start = time.perf_counter()
+    puzzles = generate(args.count,args.seed,args.givens,args.workers,box=args.box)
+    if args.output and args.output.endswith(SUFFIX):
+        with PuzzleStoreWriter(args.output,"generated",solutions=True) as writer:
+            for puzzle,solution in puzzles:
+                writer.write(puzzle,solution)
+    else:
+        out = open(args.output,"w") if args.output else sys.stdout
+        try:
+            for puzzle,_ in puzzles:
+                out.write(puzzle+"\n")
+        finally:
+            if out is not sys.stdout: out.close()
+    elapsed = time.perf_counter()-start
+    print(f"{args.count} puzzles in {elapsed:.2f}s ({args.count/elapsed:.1f} puzzles/s)",file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Opt-in timing of a state manager.
+
+Pass a Profiler to StateManager or StackStateManager and it measures the update and draw of every state,
+the on_init/on_enter/on_exit calls and resources of the loading workers and the whole transitions between states.
+The last window durations of every measurement are kept for percentiles and histograms,
+every measurement also becomes a complete event of a Chrome trace (open it in chrome://tracing or Perfetto)."""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Sequence
+from pygame.color import Color
+from pygame.font import Font, SysFont
+from pygame.rect import Rect
+from pygame.surface import Surface
+from _utils import render_text
+
+# upper bounds (ms) of the histogram buckets, the last bucket takes the rest
+BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33, 66, 133, 266)
+
+def percentile(sorted_values: Sequence[float], p: float)->float:
+    """ The value below which the fraction p of the sorted values lies (nearest rank), 0 for no values """
+    if not sorted_values: return 0.0
+    return sorted_values[min(len(sorted_values)-1,int(p*len(sorted_values)))]
+
+class Profiler:
+    def __init__(self, window: int = 600, max_events: int = 200_000, overlay: bool = False):
+        """ window: durations kept per measurement, max_events: trace events kept (the oldest are dropped) """
+        self.window = window
+        self.overlay = overlay
+        self.durations: dict[str,deque[float]] = {} # ms
+        self.events: deque[dict[str,Any]] = deque(maxlen=max_events)
+        self.frames: deque[float] = deque(maxlen=240) # start times of the last frames
+        self.threads: dict[int,str] = {}
+        self.lock = threading.Lock() # loading workers measure too
+        self.origin = time.perf_counter()
+        self.overlay_rect = Rect(5,5,230,50)
+        self._font: Optional[Font] = None
+
+    def record(self, name: str, category: str, start: float, end: float)->None:
+        """ Adds a measurement of perf_counter start and end times """
+        thread = threading.current_thread()
+        with self.lock:
+            if name not in self.durations:
+                self.durations[name] = deque(maxlen=self.window)
+            self.durations[name].append((end-start)*1000)
+            self.threads.setdefault(thread.ident or 0,thread.name)
+            self.events.append({"name":name,"cat":category,"ph":"X","pid":os.getpid(),"tid":thread.ident or 0,
+                "ts":(start-self.origin)*1e6,"dur":(end-start)*1e6})
+
+    @contextmanager
+    def measure(self, name: str, category: str)->Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name,category,start,time.perf_counter())
+
+    def frame(self)->None:
+        """ Marks the start of a frame for the frame rate """
+        self.frames.append(time.perf_counter())
+
+    def fps(self)->float:
+        if len(self.frames) < 2: return 0.0
+        span = self.frames[-1]-self.frames[0]
+        return (len(self.frames)-1)/span if span else 0.0
+
+    def percentile(self, name: str, p: float)->float:
+        with self.lock:
+            values = sorted(self.durations.get(name,()))
+        return percentile(values,p)
+
+    def histogram(self, name: str)->list[int]:
+        """ Counts of the kept durations per bucket of BUCKETS (plus one for everything slower) """
+        counts = [0]*(len(BUCKETS)+1)
+        with self.lock:
+            values = list(self.durations.get(name,()))
+        for value in values:
+            counts[bisect_left(BUCKETS,value)] += 1
+        return counts
+
+    def summary(self)->dict[str,dict[str,float]]:
+        """ count, mean, p50, p95 and max (ms) of the kept durations of every measurement """
+        with self.lock:
+            names = list(self.durations)
+        result = {}
+        for name in names:
+            with self.lock:
+                values = sorted(self.durations[name])
+            result[name] = {"count":len(values),"mean":sum(values)/len(values),"p50":values[len(values)//2],
+                "p95":values[min(len(values)-1,int(0.95*len(values)))],"max":values[-1]}
+        return result
+
+    def draw_overlay(self, s: Surface, state: str)->None:
+        """ Draws the frame rate and the p95 frame time (update + draw) of state in the top left corner """
+        if self._font is None:
+            self._font = SysFont(None,22)
+        p95 = self.percentile(f"{state}.update",0.95)+self.percentile(f"{state}.draw",0.95)
+        s.fill(Color("black"),self.overlay_rect)
+        for i,line in enumerate((f"{self.fps():5.1f} fps", f"{state} p95 {p95:.2f} ms")):
+            s.blit(render_text(self._font,line,Color("white")),(self.overlay_rect.x+6,self.overlay_rect.y+6+i*20))
+
+    def chrome_trace(self)->dict[str,Any]:
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        names = [{"name":"thread_name","ph":"M","pid":os.getpid(),"tid":tid,"args":{"name":name}} for tid,name in threads.items()]
+        return {"traceEvents":names+events,"displayTimeUnit":"ms"}
+
+    def export_chrome_trace(self, path: str)->None:
+        with open(path,"w") as f:
+            json.dump(self.chrome_trace(),f)
@@ -0,0 +1,100 @@
+"""Ready to play puzzles per difficulty.
+
+A daemon thread keeps up to depth puzzles of every watched difficulty parsed, validated and (optionally) solved,
+so starting or restarting a game only pops a prepared board instead of reading, parsing and checking a puzzle."""
+import threading
+from collections import deque
+from random import Random
+from typing import Callable, NamedTuple, Optional
+from CompactBoard import CompactBoard
+from SudokuBoard import SudokuBoard
+from _utils import Board
+
+class ReadyPuzzle(NamedTuple):
+    key: str # the difficulty
+    index: int # index of the puzzle in the file of the difficulty
+    board: Board
+    solution: Optional[Board]
+
+class PuzzleQueue:
+    """ source(key, rng) picks a puzzle of a difficulty with the random generator rng and returns its index and literal.
+    Only the worker thread calls it, with one generator per key that is seeded from seed and the key. So with a seed
+    every difficulty gets the same puzzles in the same order, however the threads are scheduled, and the picks neither
+    depend on nor disturb the global random state of the main thread """
+    def __init__(self, source: Callable[[str,Random],tuple[int,str]], depth: int = 2, solutions: bool = False, attempts: int = 20,
+                 seed: Optional[int] = None):
+        self.source = source
+        self.seed = seed
+        self.randoms: dict[str,Random] = {}
+        self.depth = depth
+        self.solutions = solutions
+        self.attempts = attempts # invalid picks in a row before a difficulty is given up
+        self.ready: dict[str,deque[ReadyPuzzle]] = {}
+        self.failed: set[str] = set()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.worker: Optional[threading.Thread] = None
+
+    def prepare(self, key: str)->Optional[ReadyPuzzle]:
+        """ Picks puzzles until one parses, has no duplicates and (with solutions) is solvable """
+        rng = self.randoms[key]
+        for _ in range(self.attempts):
+            index,lit = self.source(key, rng)
+            try:
+                board = SudokuBoard(CompactBoard.from_literal(lit))
+            except ValueError:
+                continue
+            if not board.checkValid(): continue
+            solution = board.solve() if self.solutions else None
+            if self.solutions and solution is None: continue
+            return ReadyPuzzle(key,index,board.board,solution)
+        return None
+
+    def watch(self, key: str)->None:
+        """ Starts keeping puzzles of key ready """
+        with self.condition:
+            if key in self.ready: return
+            self.randoms[key] = Random(None if self.seed is None else f"{self.seed}:{key}")
+            self.ready[key] = deque()
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name="PuzzleQueue", daemon=True)
+                self.worker.start()
+            self.condition.notify_all()
+
+    def get(self, key: str)->ReadyPuzzle:
+        """ A prepared puzzle of key. Waits for the worker if none is ready yet, so the puzzles come in the order of
+        the key's generator. Raises ValueError if the worker gave up on key or the queue is closed """
+        self.watch(key)
+        with self.condition:
+            queue = self.ready[key]
+            while not queue and key not in self.failed and not self.closed:
+                self.condition.wait()
+            if not queue:
+                raise ValueError(f"No valid puzzle for {key} in {self.attempts} attempts" if key in self.failed else "The queue is closed")
+            puzzle = queue.popleft()
+            self.condition.notify_all()
+        return puzzle
+
+    def _missing(self)->Optional[str]:
+        """ The watched key with the fewest ready puzzles if it has less than depth """
+        keys = [key for key,queue in self.ready.items() if len(queue) < self.depth and key not in self.failed]
+        return min(keys,key=lambda key:len(self.ready[key]),default=None)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.closed and (key := self._missing()) is None:
+                    self.condition.wait()
+                if self.closed: return
+            puzzle = self.prepare(key)
+            with self.condition:
+                if puzzle is None:
+                    self.failed.add(key)
+                else:
+                    self.ready[key].append(puzzle)
+                self.condition.notify_all() # a get may wait for it
+
+    def close(self)->None:
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
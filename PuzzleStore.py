@@ -0,0 +1,178 @@
+"""Packed binary puzzle store.
+
+Layout: a 32 byte header (magic, version, flags, count, crc32 of the records, difficulty tag)
+followed by fixed size records. A record is the puzzle with 4 bits per cell (41 bytes),
+followed by the solution in the same encoding if the store has solutions."""
+import mmap
+import os
+import struct
+import threading
+import zlib
+from random import randrange
+from typing import BinaryIO, Iterator, Optional
+from CompactBoard import CompactBoard
+from Corpus import Corpus
+
+HEADER = struct.Struct("<4sBBxxII16s") # magic, version, flags, count, crc32, difficulty
+DIFFICULTY_SIZE = 16 # bytes of the UTF-8 difficulty tag
+MAGIC = b"SDKS"
+VERSION = 1
+HAS_SOLUTIONS = 1
+PACKED_SIZE = 41
+SUFFIX = ".sdks"
+
+_HIGH = bytes(b>>4 for b in range(256))
+_LOW = bytes(b&0xF for b in range(256))
+
+def pack(board:CompactBoard)->bytes:
+    """ Packs the 81 cells into 41 bytes, two cells per byte (first cell in the high nibble) """
+    cells = board.cells
+    return bytes([cells[i]<<4 | cells[i+1] for i in range(0,80,2)] + [cells[80]<<4])
+
+def unpack(data:bytes)->CompactBoard:
+    """ Inverse of pack """
+    cells = bytearray(2*PACKED_SIZE)
+    cells[0::2] = data.translate(_HIGH)
+    cells[1::2] = data.translate(_LOW)
+    del cells[81:]
+    return CompactBoard(cells)
+
+class PuzzleStoreWriter:
+    """ Streams puzzles into a store. The header is completed on close, so the memory use doesn't depend on the puzzle count.
+    Use it as a context manager """
+    def __init__(self,path:str,difficulty:str="",solutions:bool=False):
+        if len(difficulty.encode()) > DIFFICULTY_SIZE:
+            raise ValueError(f"The difficulty tag {difficulty!r} is longer than {DIFFICULTY_SIZE} bytes")
+        self.path = path
+        self.difficulty = difficulty
+        self.solutions = solutions
+        self.count = 0
+        self.crc = 0
+        self.file: BinaryIO = open(path,"wb")
+        self.file.write(bytes(HEADER.size))
+    def write(self,puzzle:str|CompactBoard,solution:Optional[str|CompactBoard]=None):
+        """ Appends a puzzle (literal or CompactBoard). The solution is required if and only if the store has solutions """
+        assert (solution is not None) == self.solutions, "Either all or none of the puzzles need a solution"
+        record = b"".join(pack(CompactBoard.from_literal(b) if isinstance(b,str) else b) for b in (puzzle,solution) if b is not None)
+        self.crc = zlib.crc32(record,self.crc)
+        self.file.write(record)
+        self.count += 1
+    def close(self):
+        if not self.file.closed:
+            self.file.seek(0)
+            self.file.write(HEADER.pack(MAGIC,VERSION,HAS_SOLUTIONS if self.solutions else 0,self.count,self.crc,self.difficulty.encode()))
+            self.file.close()
+    def abort(self):
+        """ Closes and deletes the unfinished store, its header is never written """
+        if not self.file.closed:
+            self.file.close()
+            os.remove(self.path)
+    def __enter__(self):
+        return self
+    def __exit__(self,exc_type,*_):
+        if exc_type is None:
+            self.close()
+        else: # a store with a valid header but only part of the puzzles would look complete
+            self.abort()
+
+class PuzzleStoreReader:
+    """ Memory maps a store and gives indexed access to its puzzles. Like Corpus, indexing returns the puzzle literal """
+    _opened: dict[str,"PuzzleStoreReader"] = {}
+    _opened_lock = threading.Lock() # like Corpus._opened_lock
+
+    @classmethod
+    def open(cls,path:str)->"PuzzleStoreReader":
+        """ Returns the shared reader of a path """
+        with cls._opened_lock:
+            if path not in cls._opened:
+                cls._opened[path] = cls(path)
+            return cls._opened[path]
+
+    def __init__(self,path:str):
+        self.path = path
+        with open(path,"rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ValueError(f"{path} is too short for a puzzle store")
+            self.mm = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        magic,version,flags,self.count,self.crc,difficulty = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is no puzzle store (version {VERSION})")
+        self.difficulty = difficulty.rstrip(b"\0").decode()
+        self.has_solutions = bool(flags & HAS_SOLUTIONS)
+        self.record_size = PACKED_SIZE*(2 if self.has_solutions else 1)
+        if len(self.mm) != HEADER.size + self.count*self.record_size:
+            raise ValueError(f"{path} is truncated")
+    def verify(self)->bool:
+        """ Whether the records match the checksum of the header """
+        return zlib.crc32(self.mm[HEADER.size:]) == self.crc
+    def _record(self,i:int)->int:
+        if i < 0: i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("puzzle index out of range")
+        return HEADER.size + i*self.record_size
+    def puzzle(self,i:int)->CompactBoard:
+        start = self._record(i)
+        return unpack(self.mm[start:start+PACKED_SIZE])
+    def solution(self,i:int)->Optional[CompactBoard]:
+        if not self.has_solutions: return None
+        start = self._record(i)+PACKED_SIZE
+        return unpack(self.mm[start:start+PACKED_SIZE])
+    def __len__(self)->int:
+        return self.count
+    def __getitem__(self,i:int)->str:
+        return self.puzzle(i).to_literal()
+    def __iter__(self)->Iterator[str]:
+        for i in range(self.count):
+            yield self[i]
+    def random(self)->str:
+        """ A random puzzle of the store """
+        return self[randrange(self.count)]
+    def close(self):
+        self.mm.close()
+
+def open_puzzles(path:str)->Corpus|PuzzleStoreReader:
+    """ The shared reader of a puzzle file: its packed store if path is one or has one next to it, otherwise the text Corpus """
+    if path.endswith(SUFFIX):
+        return PuzzleStoreReader.open(path)
+    if os.path.exists(path+SUFFIX):
+        return PuzzleStoreReader.open(path+SUFFIX)
+    return Corpus.open(path)
+
+def convert(src:str,dst:Optional[str]=None,difficulty:str="",solutions:bool=False)->int:
+    """ Streams a text puzzle file (one literal per line, # comments) into a store and returns the puzzle count.
+    With solutions every puzzle is solved on the way """
+    import Solver
+    dst = dst or src+SUFFIX
+    with open(src,"r") as f, PuzzleStoreWriter(dst,difficulty,solutions) as writer:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"): continue
+            puzzle = CompactBoard.from_literal(line)
+            solution = None
+            if solutions:
+                cells = Solver.solve(puzzle.cells)
+                if cells is None:
+                    raise ValueError(f"Puzzle {writer.count} of {src} has no solution: {line}")
+                solution = CompactBoard(bytes(cells))
+            writer.write(puzzle,solution)
+        return writer.count
+
+def main():
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description="Converts text puzzle files into packed puzzle stores")
+    parser.add_argument("src", nargs="+", help="text puzzle files")
+    parser.add_argument("-o","--output", help=f"output path (only with a single src, defaults to <src>{SUFFIX})")
+    parser.add_argument("-d","--difficulty", default="", help="difficulty tag stored in the header")
+    parser.add_argument("-s","--solutions", action="store_true", help="solve the puzzles and store the solutions")
+    args = parser.parse_args()
+    if args.output and len(args.src) > 1:
+        parser.error("--output only works with a single src")
+    if len(args.difficulty.encode()) > DIFFICULTY_SIZE:
+        parser.error(f"--difficulty takes at most {DIFFICULTY_SIZE} bytes")
+    for src in args.src:
+        dst = args.output or src+SUFFIX
+        count = convert(src,dst,args.difficulty,args.solutions)
+        print(f"{src} -> {dst}: {count} puzzles")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Rates puzzles by the human techniques needed to solve them.
+
+The solver repeatedly applies the easiest technique of TECHNIQUES that makes progress.
+The rating is the hardest technique used and the sum of the weights of all steps.
+If no technique applies, one cell is filled from the solution ("Trial").
+
+    py Rating.py data/puzzles0_kaggle     # rates a whole file on all cores and writes data/puzzles0_kaggle.rating"""
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT","1")
+import struct
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from random import Random, randrange
+from typing import Callable, NamedTuple, Optional, Sequence
+import Solver
+from Solver import ALL, BITS, CELL_UNITS, PEERS, POPCOUNT, UNITS
+
+class Step(NamedTuple):
+    """ One deduction. Cells are flat indices (x*9+y), masks are digit masks like in Solver """
+    technique: str
+    placements: list[tuple[int,int]] # (cell, number)
+    eliminations: list[tuple[int,int]] # (cell, mask of removed candidates)
+    support: list[int] # the cells the deduction is based on
+
+class Rating(NamedTuple):
+    hardest: int # index into TECHNIQUES
+    score: int
+    steps: int
+    @property
+    def technique(self)->str:
+        return TECHNIQUES[self.hardest][0]
+
+Candidates = list[int]
+
+# every box with every line crossing it: (shared cells, rest of the line, rest of the box)
+BOX_LINES: list[tuple[list[int],list[int],list[int]]] = [
+    ([i for i in UNITS[b] if i in UNITS[u]],[i for i in UNITS[u] if i not in UNITS[b]],[i for i in UNITS[b] if i not in UNITS[u]])
+    for b in range(18,27) for u in range(18) if set(UNITS[b]) & set(UNITS[u])]
+
+def candidates(cells:Sequence[int])->Candidates:
+    """ The candidate masks of all cells (0 for filled cells) """
+    used = Solver.unit_masks(cells)
+    if used is None:
+        raise ValueError("The board contains duplicates")
+    return [0 if cells[i] else ALL & ~(used[c]|used[r]|used[b]) for i,(c,r,b) in enumerate(CELL_UNITS)]
+
+def _eliminate(cand:Candidates,cells:list[int],mask:int,support:list[int])->list[tuple[int,int]]:
+    return [(i,cand[i]&mask) for i in cells if cand[i]&mask and i not in support]
+
+def hidden_single(cells:list[int],cand:Candidates)->Optional[Step]:
+    for unit in UNITS:
+        once = twice = 0
+        for i in unit:
+            twice |= once & cand[i]
+            once |= cand[i]
+        hidden = once & ~twice
+        if hidden:
+            bit = hidden & -hidden
+            i = next(i for i in unit if cand[i] & bit)
+            return Step("Hidden Single",[(i,Solver.digit(bit))],[],[j for j in unit if j != i])
+    return None
+
+def naked_single(cells:list[int],cand:Candidates)->Optional[Step]:
+    for i,mask in enumerate(cand):
+        if mask and not mask & (mask-1):
+            return Step("Naked Single",[(i,Solver.digit(mask))],[],[p for p in PEERS[i] if cells[p]])
+    return None
+
+def locked_candidates(cells:list[int],cand:Candidates)->Optional[Step]:
+    """ Pointing (a digit of a box only in one line) and claiming (a digit of a line only in one box) """
+    for shared,line_rest,box_rest in BOX_LINES:
+        inside = 0
+        for i in shared: inside |= cand[i]
+        if not inside: continue
+        line = box = 0
+        for i in line_rest: line |= cand[i]
+        for i in box_rest: box |= cand[i]
+        for name,mask,targets in (("Pointing",inside & ~box & line,line_rest),("Claiming",inside & ~line & box,box_rest)):
+            if mask:
+                bit = mask & -mask
+                return Step(name,[],_eliminate(cand,targets,bit,shared),[i for i in shared if cand[i] & bit])
+    return None
+
+def _naked_subset(size:int,name:str)->Callable[[list[int],Candidates],Optional[Step]]:
+    def finder(cells:list[int],cand:Candidates)->Optional[Step]:
+        for unit in UNITS:
+            open_cells = [i for i in unit if cand[i] and POPCOUNT[cand[i]] <= size]
+            if len(open_cells) < size: continue
+            for subset in combinations(open_cells,size):
+                mask = 0
+                for i in subset: mask |= cand[i]
+                if POPCOUNT[mask] == size:
+                    eliminations = _eliminate(cand,unit,mask,list(subset))
+                    if eliminations:
+                        return Step(name,[],eliminations,list(subset))
+        return None
+    return finder
+
+def _hidden_subset(size:int,name:str)->Callable[[list[int],Candidates],Optional[Step]]:
+    def finder(cells:list[int],cand:Candidates)->Optional[Step]:
+        for unit in UNITS:
+            places = {d:[i for i in unit if cand[i] & BITS[d]] for d in range(1,10)}
+            digits = [d for d,p in places.items() if 2 <= len(p) <= size]
+            for subset in combinations(digits,size):
+                spots = sorted({i for d in subset for i in places[d]})
+                if len(spots) == size:
+                    keep = 0
+                    for d in subset: keep |= BITS[d]
+                    eliminations = [(i,cand[i] & ~keep) for i in spots if cand[i] & ~keep]
+                    if eliminations:
+                        return Step(name,[],eliminations,spots)
+        return None
+    return finder
+
+def _fish(size:int,name:str)->Callable[[list[int],Candidates],Optional[Step]]:
+    def finder(cells:list[int],cand:Candidates)->Optional[Step]:
+        for d in range(1,10):
+            bit = BITS[d]
+            for bases,cover_of in ((range(9,18),0),(range(0,9),1)): # rows covered by columns and columns covered by rows
+                lines = []
+                for u in bases:
+                    covers = 0
+                    for i in UNITS[u]:
+                        if cand[i] & bit: covers |= 1 << CELL_UNITS[i][cover_of]%9
+                    if 2 <= POPCOUNT[covers] <= size:
+                        lines.append((u,covers))
+                for subset in combinations(lines,size):
+                    covers = 0
+                    for _,c in subset: covers |= c
+                    if POPCOUNT[covers] == size:
+                        base_cells = [i for u,_ in subset for i in UNITS[u] if cand[i] & bit]
+                        targets = [i for c in range(9 if cover_of else 0,18 if cover_of else 9) if covers & 1 << (c%9) for i in UNITS[c]]
+                        eliminations = _eliminate(cand,targets,bit,base_cells)
+                        if eliminations:
+                            return Step(name,[],eliminations,base_cells)
+        return None
+    return finder
+
+TECHNIQUES: list[tuple[str,int,Callable[[list[int],Candidates],Optional[Step]]]] = [
+    ("Hidden Single",1,hidden_single),
+    ("Naked Single",2,naked_single),
+    ("Locked Candidates",5,locked_candidates),
+    ("Naked Pair",8,_naked_subset(2,"Naked Pair")),
+    ("Hidden Pair",10,_hidden_subset(2,"Hidden Pair")),
+    ("Naked Triple",12,_naked_subset(3,"Naked Triple")),
+    ("Hidden Triple",15,_hidden_subset(3,"Hidden Triple")),
+    ("X-Wing",20,_fish(2,"X-Wing")),
+    ("Swordfish",25,_fish(3,"Swordfish")),
+]
+TRIAL = len(TECHNIQUES)
+TECHNIQUES.append(("Trial",50,lambda cells,cand:None))
+TECHNIQUE_INDEX = {name:i for i,(name,_,_) in enumerate(TECHNIQUES)}
+TECHNIQUE_INDEX.update({"Pointing":TECHNIQUE_INDEX["Locked Candidates"],"Claiming":TECHNIQUE_INDEX["Locked Candidates"]})
+TYPICAL_EMPTY = 56 # empty cells of a puzzle with 25 givens
+
+def typical_score(technique:str)->int:
+    """ The score of a typical puzzle whose hardest step is technique: a single for every empty cell
+    and one step of every technique of the ladder after the singles up to technique """
+    return TYPICAL_EMPTY+sum(weight for _,weight,_ in TECHNIQUES[TECHNIQUE_INDEX["Locked Candidates"]:TECHNIQUE_INDEX[technique]+1])
+
+def next_step(cells:list[int],cand:Candidates,hardest:int=TRIAL-1)->Optional[Step]:
+    """ The easiest step of the techniques up to hardest or None if none applies """
+    for _,_,finder in TECHNIQUES[:hardest+1]:
+        step = finder(cells,cand)
+        if step is not None:
+            return step
+    return None
+
+def place(cells:list[int],cand:Candidates,i:int,num:int):
+    cells[i] = num
+    cand[i] = 0
+    bit = BITS[num]
+    for p in PEERS[i]:
+        cand[p] &= ~bit
+
+def apply_step(cells:list[int],cand:Candidates,step:Step):
+    for i,mask in step.eliminations:
+        cand[i] &= ~mask
+    for i,num in step.placements:
+        place(cells,cand,i,num)
+
+def rate(puzzle:Sequence[int])->Optional[Rating]:
+    """ Rates a flat puzzle. Returns None if the puzzle has no solution """
+    cells = list(puzzle)
+    solution = Solver.solve(cells)
+    if solution is None: return None
+    cand = candidates(cells)
+    hardest = score = steps = 0
+    while 0 in cells:
+        step = next_step(cells,cand)
+        if step is None: # fill the empty cell with the fewest candidates from the solution
+            i = min((i for i in range(81) if not cells[i]),key=lambda i:POPCOUNT[cand[i]])
+            step = Step("Trial",[(i,solution[i])],[],[])
+        level = TECHNIQUE_INDEX[step.technique]
+        hardest = max(hardest,level)
+        score += TECHNIQUES[level][1]
+        steps += 1
+        apply_step(cells,cand,step)
+    return Rating(hardest,score,steps)
+
+class RatingIndex:
+    """ The ratings of a puzzle file, stored next to it as <path>.rating.
+    Puzzles are bucketed by score//SCORE_STEP, so pick finds a puzzle close to a target score in O(1) """
+    _header = struct.Struct("<4sBxxxQQI") # magic, version, source size, source mtime, count
+    _magic = b"SRAT"
+    _version = 1
+    SCORE_STEP = 10
+    LEVELS = 256
+    SUFFIX = ".rating"
+    _opened: dict[str,Optional["RatingIndex"]] = {}
+    _opened_lock = threading.Lock() # like Corpus._opened_lock
+
+    def __init__(self,scores:array,hardest:array):
+        self.scores = scores # array("H")
+        self.hardest = hardest # array("B")
+        levels = [self.level(s) for s in scores]
+        self.order = array("I",sorted(range(len(scores)),key=levels.__getitem__))
+        self.starts = array("I",[0]*(self.LEVELS+1))
+        for level in levels:
+            self.starts[level+1] += 1
+        for level in range(self.LEVELS):
+            self.starts[level+1] += self.starts[level]
+        # nearest non empty level for every level
+        filled = [level for level in range(self.LEVELS) if self.starts[level+1] > self.starts[level]]
+        self.nearest = array("B",[min(filled,key=lambda f:abs(f-level)) if filled else 0 for level in range(self.LEVELS)])
+
+    @classmethod
+    def level(cls,score:int)->int:
+        return min(cls.LEVELS-1,score//cls.SCORE_STEP)
+
+    def __len__(self)->int:
+        return len(self.scores)
+
+    def rating(self,i:int)->Rating:
+        return Rating(self.hardest[i],self.scores[i],0)
+
+    def pick(self,target_score:int,rng:Optional[Random]=None)->Optional[int]:
+        """ The index of a random puzzle with a score close to target_score, None if the index is empty.
+        Draws from rng if given, otherwise from the global random state """
+        level = self.nearest[self.level(target_score)]
+        if self.starts[level] == self.starts[level+1]: return None
+        return self.order[(rng.randrange if rng else randrange)(self.starts[level],self.starts[level+1])]
+
+    @classmethod
+    def open(cls,path:str)->Optional["RatingIndex"]:
+        """ The shared index of a puzzle file or None if the file wasn't rated (or changed since) """
+        with cls._opened_lock:
+            if path not in cls._opened:
+                cls._opened[path] = cls.load(path)
+            return cls._opened[path]
+
+    @classmethod
+    def load(cls,path:str)->Optional["RatingIndex"]:
+        try:
+            stat = os.stat(path)
+            with open(path+cls.SUFFIX,"rb") as f:
+                magic,version,size,mtime,count = cls._header.unpack(f.read(cls._header.size))
+                if (magic,version,size,mtime) != (cls._magic,cls._version,stat.st_size,stat.st_mtime_ns):
+                    return None
+                scores,hardest = array("H"),array("B")
+                scores.fromfile(f,count)
+                hardest.fromfile(f,count)
+                return cls(scores,hardest)
+        except (OSError,struct.error,EOFError):
+            return None
+
+    def save(self,path:str):
+        stat = os.stat(path)
+        with open(path+self.SUFFIX,"wb") as f:
+            f.write(self._header.pack(self._magic,self._version,stat.st_size,stat.st_mtime_ns,len(self)))
+            self.scores.tofile(f)
+            self.hardest.tofile(f)
+
+def rate_range(path:str,start:int,stop:int)->list[tuple[int,int]]:
+    """ (score, hardest) of the puzzles start to stop-1 of a puzzle file. Unsolvable puzzles get the maximal score """
+    from CompactBoard import CompactBoard
+    from PuzzleStore import open_puzzles
+    puzzles = open_puzzles(path)
+    results = []
+    for i in range(start,stop):
+        rating = rate(CompactBoard.from_literal(puzzles[i]).cells)
+        results.append((min(rating.score,0xFFFF),rating.hardest) if rating else (0xFFFF,TRIAL))
+    return results
+
+def rate_file(path:str,workers:Optional[int]=None,chunk_size:int=64)->RatingIndex:
+    """ Rates every puzzle of a file on a process pool and saves the RatingIndex next to it """
+    from PuzzleStore import open_puzzles
+    count = len(open_puzzles(path))
+    scores,hardest = array("H"),array("B")
+    starts = range(0,count,chunk_size)
+    with ProcessPoolExecutor(workers) as executor:
+        for chunk in executor.map(rate_range,[path]*len(starts),starts,[min(count,s+chunk_size) for s in starts]):
+            for score,level in chunk:
+                scores.append(score)
+                hardest.append(level)
+    index = RatingIndex(scores,hardest)
+    index.save(path)
+    return index
+
+def main():
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description="Rate puzzle files by the human techniques they need")
+    parser.add_argument("paths",nargs="+",help="puzzle files (text or packed store)")
+    parser.add_argument("-j","--workers",type=int,help="number of processes (defaults to the number of cores)")
+    args = parser.parse_args()
+    for path in args.paths:
+        start = time.perf_counter()
+        index = rate_file(path,args.workers)
+        elapsed = time.perf_counter()-start
+        print(f"{path}: {len(index)} puzzles in {elapsed:.2f}s ({len(index)/elapsed:.0f} puzzles/s)",file=sys.stderr)
+        for level,(name,_,_) in enumerate(TECHNIQUES):
+            count = index.hardest.count(level)
+            if count:
+                print(f"  {name:<18} {count:>8}",file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
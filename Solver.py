@@ -0,0 +1,332 @@
+"""Bitmask constraint propagation solver.
+
+Works on flat boards: a sequence of n*n ints where cell (x,y) of a `SudokuBoard` is at index x*n+y and 0 is empty.
+Every column, row and box keeps an n-bit mask of the digits it already holds (bit d-1 for digit d),
+so the candidates of a cell are just `ALL & ~(col|row|box)`. Python ints are arbitrarily wide,
+so the same code solves 16x16 and 25x25 boards, the size of a board follows from its number of cells."""
+from math import isqrt
+from random import Random
+from typing import Iterator, Optional, Sequence
+
+class Geometry:
+    """The units of a board with boxes of box*box cells, which holds the digits 1 to n = box*box in n*n cells.
+    Unit indices: 0 to n-1 are the columns (board[x]), n to 2n-1 the rows, 2n to 3n-1 the boxes (same order as SudokuBoard.box_from_index)"""
+    def __init__(self, box: int):
+        self.box = box
+        self.n = n = box*box
+        self.cells = n*n
+        self.all = (1 << n)-1
+        self.bits = [0] + [1 << d for d in range(n)]
+        self.cell_units: list[tuple[int,int,int]] = [(x, n+y, 2*n+y//box*box+x//box) for x in range(n) for y in range(n)]
+        self.units: list[list[int]] = [[] for _ in range(3*n)]
+        for i, cell_units in enumerate(self.cell_units):
+            for u in cell_units:
+                self.units[u].append(i)
+        self.peers: list[tuple[int,...]] = [tuple(sorted({p for u in self.cell_units[i] for p in self.units[u]} - {i})) for i in range(self.cells)]
+
+_geometries: dict[int,Geometry] = {}
+def geometry(box: int = 3)->Geometry:
+    """The shared geometry of a box size"""
+    if box not in _geometries:
+        _geometries[box] = Geometry(box)
+    return _geometries[box]
+
+def geometry_of(cells: int)->Geometry:
+    """The geometry of a flat board with this many cells"""
+    box = isqrt(isqrt(cells))
+    if box < 1 or box**4 != cells:
+        raise ValueError(f"{cells} cells are no sudoku board")
+    return geometry(box)
+
+CLASSIC = geometry(3)
+ALL = CLASSIC.all
+BITS = CLASSIC.bits
+"BITS[digit] is the mask bit of that digit, BITS[0] is 0"
+POPCOUNT = [bin(m).count("1") for m in range(ALL+1)]
+
+CELL_UNITS = CLASSIC.cell_units
+UNITS = CLASSIC.units
+PEERS = CLASSIC.peers
+
+def digit(bit: int)->int:
+    """The digit of a single mask bit"""
+    return bit.bit_length()
+
+def unit_masks(cells: Sequence[int])->Optional[list[int]]:
+    """The occupancy mask of all 3n units or None if a digit appears twice in a unit"""
+    g = geometry_of(len(cells))
+    bits, cell_units = g.bits, g.cell_units
+    used = [0]*(3*g.n)
+    for i, num in enumerate(cells):
+        if num:
+            bit = bits[num]
+            for u in cell_units[i]:
+                if used[u] & bit:
+                    return None
+                used[u] |= bit
+    return used
+
+class _Contradiction(Exception):
+    """A cell without candidates or a digit without a place in some unit, args[0] are the units to blame"""
+
+class _Grid:
+    """The search state of a flat board: the candidate masks of the cells (0 for filled ones), the digit masks of
+    the units and places[u*n+d-1], the number of cells of unit u that can still take digit d.
+    Placing a digit only looks at its peers and at the units whose places changed: a cell left with one candidate
+    or a digit left with one place in a unit goes into singles, a digit with at most box places into locked"""
+    __slots__ = ("g", "cells", "cand", "used", "places", "singles", "locked")
+
+    def __init__(self, cells: list[int], used: list[int], g: Geometry):
+        n = g.n
+        self.g, self.cells, self.used = g, cells, used
+        self.cand = cand = [0]*g.cells
+        self.places = places = [0]*(3*n*n)
+        for i, (c, r, b) in enumerate(g.cell_units):
+            if cells[i]: continue
+            mask = cand[i] = g.all & ~(used[c] | used[r] | used[b])
+            while mask:
+                bit = mask & -mask
+                mask ^= bit
+                d = bit.bit_length()-1
+                places[c*n+d] += 1; places[r*n+d] += 1; places[b*n+d] += 1
+        self.singles: list = [i for i, mask in enumerate(cand) if mask and not mask & (mask-1)]
+        self.locked: set[tuple[int,int]] = set()
+        for k, count in enumerate(places):
+            if count <= g.box:
+                u, d = divmod(k, n)
+                if not used[u] >> d & 1:
+                    if not count: raise _Contradiction((u,))
+                    if count == 1: self.singles.append((u, 1 << d))
+                    else: self.locked.add((u, 1 << d))
+
+    def copy(self)->"_Grid":
+        grid = _Grid.__new__(_Grid)
+        grid.g, grid.cells, grid.cand, grid.used, grid.places = self.g, self.cells[:], self.cand[:], self.used[:], self.places[:]
+        grid.singles, grid.locked = [], set()
+        return grid
+
+    def _lose_place(self, u: int, bit: int, k: int):
+        """Counts one place less for a digit in unit u (k is u*n+d-1)"""
+        places = self.places
+        places[k] -= 1
+        count = places[k]
+        if count <= self.g.box and not self.used[u] & bit:
+            if not count: raise _Contradiction((u,))
+            if count == 1: self.singles.append((u, bit))
+            else: self.locked.add((u, bit))
+
+    def remove(self, p: int, bit: int):
+        """Removes a candidate of an empty cell"""
+        mask = self.cand[p] ^ bit
+        if not mask: raise _Contradiction(self.g.cell_units[p])
+        self.cand[p] = mask
+        if not mask & (mask-1): self.singles.append(p)
+        n, d = self.g.n, bit.bit_length()-1
+        for u in self.g.cell_units[p]:
+            self._lose_place(u, bit, u*n+d)
+
+    def assign(self, i: int, bit: int):
+        """Places a digit and removes it from the candidates of the peers (the same as remove, inlined for speed)"""
+        g, cand, used, places, singles, locked = self.g, self.cand, self.used, self.places, self.singles, self.locked
+        n, box, cell_units = g.n, g.box, g.cell_units
+        self.cells[i] = bit.bit_length()
+        units = cell_units[i]
+        for u in units:
+            used[u] |= bit
+        others = cand[i] ^ bit
+        cand[i] = 0
+        while others: # the other candidates of i lose a place in the units of i
+            other = others & -others
+            others ^= other
+            d = other.bit_length()-1
+            for u in units:
+                k = u*n+d
+                places[k] -= 1
+                if places[k] <= box and not used[u] & other:
+                    if not places[k]: raise _Contradiction((u,))
+                    if places[k] == 1: singles.append((u, other))
+                    else: locked.add((u, other))
+        d = bit.bit_length()-1
+        for p in g.peers[i]:
+            mask = cand[p]
+            if mask & bit:
+                mask ^= bit
+                if not mask: raise _Contradiction(cell_units[p])
+                cand[p] = mask
+                if not mask & (mask-1): singles.append(p)
+                for u in cell_units[p]:
+                    k = u*n+d
+                    places[k] -= 1
+                    if places[k] <= box and not used[u] & bit:
+                        if not places[k]: raise _Contradiction((u,))
+                        if places[k] == 1: singles.append((u, bit))
+                        else: locked.add((u, bit))
+
+    def propagate(self):
+        """Places naked and hidden singles and removes locked candidates until nothing changes:
+        a digit whose places in a box lie in one line can't be elsewhere in that line (pointing) and vice versa (claiming)"""
+        g, cells, cand, used, singles, locked = self.g, self.cells, self.cand, self.used, self.singles, self.locked
+        units, cell_units = g.units, g.cell_units
+        while singles or locked:
+            if singles:
+                item = singles.pop()
+                if type(item) is int: # naked single
+                    if not cells[item]:
+                        self.assign(item, cand[item])
+                    continue
+                u, bit = item # hidden single
+                if not used[u] & bit:
+                    self.assign(next(i for i in units[u] if cand[i] & bit), bit)
+                continue
+            u, bit = locked.pop()
+            if used[u] & bit: continue
+            spots = [i for i in units[u] if cand[i] & bit]
+            first = cell_units[spots[0]]
+            for k in ((0, 1) if u >= 2*g.n else (2,)): # the lines of a box, the box of a line
+                other = first[k]
+                if all(cell_units[i][k] == other for i in spots):
+                    for p in units[other]:
+                        if cand[p] & bit and u not in cell_units[p]:
+                            self.remove(p, bit)
+
+def _search(grid: _Grid)->Iterator[list[int]]:
+    try:
+        grid.propagate()
+    except _Contradiction:
+        return
+    g, cand = grid.g, grid.cand
+    best, best_count = -1, g.n+1
+    for i, mask in enumerate(cand):
+        if mask and (count := mask.bit_count()) < best_count:
+            best, best_count = i, count
+            if count == 2: break
+    if best < 0:
+        yield grid.cells
+        return
+    # minimum remaining values branching: over the candidates of a cell or the places of a digit in a unit
+    options = [(best, bit) for bit in _bits(cand[best])]
+    if best_count > 2:
+        n, used = g.n, grid.used
+        for k, count in enumerate(grid.places):
+            if count < best_count:
+                u, d = divmod(k, n)
+                if not used[u] >> d & 1:
+                    bit = 1 << d
+                    options = [(i, bit) for i in g.units[u] if cand[i] & bit]
+                    best_count = count
+                    if count == 2: break
+    for i, bit in options:
+        branch = grid.copy()
+        try:
+            branch.assign(i, bit)
+        except _Contradiction:
+            continue
+        yield from _search(branch)
+
+def _bits(mask: int)->Iterator[int]:
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        yield bit
+
+class _OutOfNodes(Exception):
+    """A run of solve used up its branchings"""
+
+class _Run:
+    """One run of solve: a depth first search that gives up after a number of branchings.
+    Every contradiction raises the weight of the units it happened in, and the search branches on the cell with
+    the fewest candidates per weight of its units, so later runs start where earlier ones got stuck.
+    Runs with a random generator break ties and order the digits randomly"""
+    def __init__(self, weights: list[int], nodes: int, rng: Optional[Random] = None):
+        self.weights, self.nodes, self.rng = weights, nodes, rng
+
+    def _blame(self, contradiction: _Contradiction):
+        for u in contradiction.args[0]:
+            self.weights[u] += 1
+
+    def search(self, grid: _Grid)->Optional[list[int]]:
+        try:
+            grid.propagate()
+        except _Contradiction as e:
+            self._blame(e)
+            return None
+        self.nodes -= 1
+        if self.nodes < 0: raise _OutOfNodes
+        weights, rng, cell_units = self.weights, self.rng, grid.g.cell_units
+        best, best_key = -1, 0.0
+        for i, mask in enumerate(grid.cand):
+            if mask:
+                c, r, b = cell_units[i]
+                key = mask.bit_count()/(weights[c]+weights[r]+weights[b])
+                if best < 0 or key < best_key or (key == best_key and rng and rng.random() < 0.3):
+                    best, best_key = i, key
+        if best < 0:
+            return grid.cells
+        options = list(_bits(grid.cand[best]))
+        if rng: rng.shuffle(options)
+        for bit in options:
+            branch = grid.copy()
+            try:
+                branch.assign(best, bit)
+            except _Contradiction as e:
+                self._blame(e)
+                continue
+            solution = self.search(branch)
+            if solution: return solution
+        return None
+
+RESTART_NODES = 50
+"Branchings of the shortest runs of solve, run k may branch RESTART_NODES*_luby(k) times"
+
+def _luby(k: int)->int:
+    """The k-th (from 0) number of the Luby sequence 1,1,2,1,1,2,4,1,1,2,1,1,2,4,8,..."""
+    size, power = 1, 0
+    while size < k+1:
+        size, power = 2*size+1, power+1
+    while size-1 != k:
+        size, power = size >> 1, power-1
+        k %= size
+    return 1 << power
+
+def _start(cells: Sequence[int])->Optional[_Grid]:
+    """The search state of a flat board or None if it breaks a rule or a digit has no place in some unit"""
+    used = unit_masks(cells)
+    if used is None: return None
+    try:
+        return _Grid(list(cells), used, geometry_of(len(cells)))
+    except _Contradiction:
+        return None
+
+def solutions(cells: Sequence[int])->Iterator[list[int]]:
+    """Yields every solution of the flat board"""
+    grid = _start(cells)
+    if grid is not None:
+        yield from _search(grid)
+
+def solve(cells: Sequence[int])->Optional[list[int]]:
+    """The first solution of the flat board or None if it has none.
+    Unlike solutions this restarts its search after 50, 50, 100, 50, 50, 100, 200... branchings (always with the
+    same seeds, so the result is reproducible), which keeps big boards like 25x25 from getting lost in a dead part
+    of the search tree. A run that ends within its branchings has either found a solution or shown there is none"""
+    grid = _start(cells)
+    if grid is None: return None
+    try:
+        grid.propagate() # once for all runs, copies start without the queued singles
+    except _Contradiction:
+        return None
+    weights = [1]*(3*grid.g.n)
+    k = 0
+    while True:
+        run = _Run(weights, RESTART_NODES*_luby(k), Random(k) if k else None)
+        try:
+            return run.search(grid.copy())
+        except _OutOfNodes:
+            k += 1
+
+def count_solutions(cells: Sequence[int], limit: int = 2)->int:
+    """Counts the solutions of the flat board but stops counting at limit"""
+    count = 0
+    for _ in solutions(cells):
+        count += 1
+        if count >= limit: break
+    return count
@@ -1,11 +1,17 @@
 from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
 import threading
-from threading import Thread
-from pygame import time, display, gfxdraw as gfx
+import time as _time
+from pygame import time, display, draw, gfxdraw as gfx
 from pygame.color import Color
 from pygame.font import SysFont
 from pygame.surface import Surface
-from typing import Iterable, Optional
+from pygame.rect import Rect
+from pygame.event import Event
+from typing import Any, Callable, Iterable, Optional
+from Profiler import Profiler
+from _utils import render_text
 
 def get_from_set(s:set|Iterable):
     for x in s:return x
@@ -13,15 +19,25 @@ def get_from_set(s:set|Iterable):
 
 class State:
     manager: "StateManager" = NotImplemented
+    animating: bool = False # whether the state has to be updated and drawn even when there are no events
+    likely_next: tuple[str,...] = () # states the manager warms up in the background while this one is shown
     @staticmethod
     def exit(to: str, **kwargs)->None:
         """ Call this function to exit the current state to another state """
         raise NotImplementedError("Use a state only with a state manager")
     def on_init(self)->None:pass
+    def resources(self)->list[Callable[[],Any]]:
+        """ Loaders the manager may run in a worker after on_init, before the state is entered. 
+        They are run once and have to be thread safe """
+        return []
     def on_enter(self,frm: str, **kwargs)->None:pass
     def on_exit(self,to:str)->None:pass
     def update(self,dt:float)->None:pass
+    def handle_event(self,event: Event)->None:pass
     def draw(self,s:Surface)->None:pass
+    def dirty_rects(self)->Optional[list[Rect]]:
+        """ The screen areas the next draw changes if the screen still shows the last frame. None means everything """
+        return None
 
 class LoadingState:
     def __init__(self):
@@ -29,14 +45,25 @@ class LoadingState:
         self.cx,self.cy = display.get_surface().get_rect().center
         self.text = self.font.render("Loading...", True, Color("black"))
         self.text_rect = self.text.get_rect(center=(self.cx,self.cy-100))
+        self.bar_rect = Rect(0,0,200,12)
+        self.bar_rect.center = self.cx,self.cy
         self.angle = 320
-    def update(self,dt:float, _: State)->None:
+        self.progress = 0.0
+    def update(self,dt:float, _: State, progress: float = 0.0)->None:
         self.angle -= dt//10
         if self.angle <=10:
             self.angle = 320
+        self.progress = progress
     def draw(self,s:Surface)->None:
         s.blit(self.text,self.text_rect)
         gfx.arc(s,self.cx,self.cy-100,50,0,self.angle, Color("black"))
+        # progress bar with the percentage below it
+        bar = self.bar_rect.copy()
+        bar.width = round(bar.width*self.progress)
+        draw.rect(s,Color("black"),bar)
+        draw.rect(s,Color("black"),self.bar_rect,1)
+        percent = render_text(self.font,f"{self.progress:.0%}",Color("black"))
+        s.blit(percent,percent.get_rect(midtop=(self.cx,self.bar_rect.bottom+8)))
 
 class StateManager:
     def __getitem__(self, key: str)->State:
@@ -45,13 +72,23 @@ class StateManager:
         def inner_func(to: str,**kwargs):
             self.set_state(to,**kwargs)
         return inner_func
-    def __init__(self,states: dict[str,State],*, start: str="", loading_state: Optional[LoadingState] = None, preload: bool = False):
+    def __init__(self,states: dict[str,State],*, start: str="", loading_state: Optional[LoadingState] = None, preload: bool = False, workers: int = 2,
+            profiler: Optional[Profiler] = None):
+        """ States are initialized, entered and warmed up by a pool of worker threads.
+        With a profiler every update, draw, loading step and transition is timed """
         assert "" not in states, "\"\" (the empty string) cannot be name of a state"
         self.states = states
+        self.profiler = profiler
         self.loading_state = loading_state or LoadingState()
         self.inited = {k:False for k in self.states.keys()}
+        self.warmed = {k:False for k in self.states.keys()} # whether the resources of the state are loaded
         self.loading = {k:False for k in self.states.keys()}
-        self.threads: dict[str,Thread] = {}
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="StateManager")
+        self.futures: dict[str,Future] = {} # the last loading job of every state
+        self.prefetches: dict[str,Future] = {}
+        self._lock = threading.Lock() # guards loading, futures and progress
+        self._state_locks = {k:threading.Lock() for k in self.states.keys()} # one state is never prepared twice at once
+        self._progress = {k:[0,0] for k in self.states.keys()} # done and total steps of the current loading job
         for name, state in states.items(): # tell states to which manager they belong
             state.exit = self._state_exit() #type: ignore
             state.manager = self
@@ -76,26 +113,71 @@ class StateManager:
         s = s or display.get_surface()
         self.update(dt)
         self.draw(s)
+    def _measure(self, name: str, category: str):
+        return nullcontext() if self.profiler is None else self.profiler.measure(name, category)
     def update(self, dt: float)->None:
         """ Update the state manager with the given delta time """
         if not self._current_state:
             raise Exception("StateManager wasn't started yet")
         else:
+            if self.profiler is not None:
+                self.profiler.frame()
             if not self.loading[self._current_state]:
-                self.current_state().update(dt)
+                with self._measure(f"{self._current_state}.update", "update"):
+                    self.current_state().update(dt)
             else:
+                future = self.futures.get(self._current_state)
+                if future is not None and future.done():
+                    future.result() # raises the exception that stopped the loading
                 if self.loading_state is not None:
-                    self.loading_state.update(dt, self.current_state())
+                    self.loading_state.update(dt, self.current_state(), self.progress())
+    def handle_event(self, event: Event)->None:
+        """ Route an input event to the current state. Events are dropped while it is loading """
+        if not self._current_state:
+            raise Exception("StateManager wasn't started yet")
+        if not self.loading[self._current_state]:
+            self.current_state().handle_event(event)
+    def progress(self)->float:
+        """ The done fraction of the loading work of the current state """
+        with self._lock:
+            done,total = self._progress[self._current_state]
+        return done/total if total else 0.0
+    def is_loading(self)->bool:
+        """ Whether the current state is still being initialized or entered """
+        return bool(self._current_state) and self.loading[self._current_state]
+    def animating(self)->bool:
+        """ Whether the next frame may look different even without any event """
+        if not self._current_state or self.loading[self._current_state]:
+            return True
+        return self.current_state().animating
     def draw(self, s: Surface)->None:
         """ Draw the state manager to the given Surface """
         if not self._current_state:
             raise Exception("StateManager wasn't started yet")
         else:
             if not self.loading[self._current_state]:
-                self.current_state().draw(s)
+                with self._measure(f"{self._current_state}.draw", "draw"):
+                    self.current_state().draw(s)
             else:
                 if self.loading_state is not None:
                     self.loading_state.draw(s)
+            if self.profiler is not None and self.profiler.overlay:
+                self.profiler.draw_overlay(s, self._current_state)
+
+    _fully_drawn: str = ""
+    def dirty_rects(self)->Optional[list[Rect]]:
+        """ The screen areas the next draw changes or None if the whole screen has to be redrawn.
+        Call it after update. Returning None assumes that the caller redraws everything """
+        if not self._current_state or self.loading[self._current_state]:
+            self._fully_drawn = ""
+            return None
+        if self._fully_drawn != self._current_state:
+            self._fully_drawn = self._current_state
+            return None
+        rects = self.current_state().dirty_rects()
+        if rects is not None and self.profiler is not None and self.profiler.overlay:
+            rects = rects+[self.profiler.overlay_rect]
+        return rects
 
     _current_state: str = ""
     def current_state(self)->State:
@@ -113,36 +195,81 @@ class StateManager:
         else:
             assert new_state in self.states and new_state,f"State invalid `{new_state}`"
             self._change_state(new_state,kwargs)
+    def _count(self, state: str, done: int = 0, total: int = 0)->None:
+        """ Adds finished and new loading steps to the progress of a state """
+        with self._lock:
+            self._progress[state][0] += done
+            self._progress[state][1] += total
+    def _prepare(self, state: str)->None:
+        """ Initializes the state and loads its resources unless that already happened. Runs in a worker """
+        with self._state_locks[state]:
+            if not self.inited[state]:
+                self._count(state, total=1)
+                with self._measure(f"{state}.on_init", "loading"):
+                    self[state].on_init()
+                self.inited[state] = True
+                self._count(state, done=1)
+            if not self.warmed[state]:
+                resources = self[state].resources()
+                self._count(state, total=len(resources))
+                for load in resources:
+                    with self._measure(f"{state}.resource", "loading"):
+                        load()
+                    self._count(state, done=1)
+                self.warmed[state] = True
+    def prefetch(self, state: str)->None:
+        """ Prepares a state in the background so entering it later doesn't have to wait for on_init and its resources """
+        with self._lock:
+            if self.inited[state] and self.warmed[state] or state in self.prefetches:
+                return
+            self.prefetches[state] = self.executor.submit(self._prepare, state)
+    def _prefetch_next(self, state: str)->None:
+        for name in self[state].likely_next:
+            self.prefetch(name)
     def _init_state(self, state: str)->None:
         if not self.inited[state]:
-            self.loading[state] = True
-            def thread_func(): # Thread this
-                self[state].on_init()
-                self.inited[state] = True
+            start = _time.perf_counter()
+            def job():
+                self._prepare(state)
+                if self.profiler is not None:
+                    self.profiler.record(f"{state}.loading", "transition", start, _time.perf_counter())
                 self.loading[state] = False
-                del self.threads[threading.current_thread().name]
-            thread = Thread(target = thread_func)
-            self.threads[thread.name] = thread
-            thread.start()
+                self._prefetch_next(state)
+            with self._lock:
+                self.loading[state] = True
+                self._progress[state] = [0,0]
+                self.futures[state] = self.executor.submit(job)
     def _change_state(self, new_state: str, kwargs)->None:
         old_state = self._current_state
-        self.loading[new_state] = True
-        self._current_state = new_state
-        def thread_func():
-            self[old_state].on_exit(new_state)
-            if not self.inited[new_state]:
-                self[new_state].on_init()
-                self.inited[new_state] = True
-            self[new_state].on_enter(frm = old_state, **kwargs)
+        start = _time.perf_counter()
+        def job():
+            with self._measure(f"{old_state}.on_exit", "loading"):
+                self[old_state].on_exit(new_state)
+            self._count(new_state, done=1)
+            self._prepare(new_state)
+            with self._measure(f"{new_state}.on_enter", "loading"):
+                self[new_state].on_enter(frm = old_state, **kwargs)
+            self._count(new_state, done=1)
+            if self.profiler is not None: # from the request until the state can be shown
+                self.profiler.record(f"{old_state}->{new_state}", "transition", start, _time.perf_counter())
             self.loading[new_state] = False
-            del self.threads[threading.current_thread().name]
-        thread = Thread(target = thread_func)
-        self.threads[thread.name] = thread
-        thread.start()
-            
+            self._prefetch_next(new_state)
+        with self._lock:
+            self.loading[new_state] = True
+            prefetch = self.prefetches.get(new_state)
+            if prefetch is None or prefetch.done():
+                self._progress[new_state] = [0,2] # on_exit and on_enter
+            else: # the job waits for the running prefetch, so its steps count too
+                self._progress[new_state][1] += 2
+            self._current_state = new_state
+            self.futures[new_state] = self.executor.submit(job)
+
+    def close(self)->None:
+        """ Waits for the running loading jobs and drops the queued ones """
+        self.executor.shutdown(wait=True, cancel_futures=True)
     def __del__(self):
-        for thread in self.threads.values():
-            thread.join()
+        if hasattr(self,"executor"):
+            self.close()
 
 class StackStateManager():
     _state_stack: deque[str] = deque()
@@ -154,9 +281,10 @@ class StackStateManager():
         def inner_func(to: str,**kwargs):
             self.set_state(to,**kwargs)
         return inner_func
-    def __init__(self,states: dict[str,State],*,start: str=""):
+    def __init__(self,states: dict[str,State],*,start: str="",profiler: Optional[Profiler]=None):
         assert "" not in states, "\"\" cannot be the name of a state"
         self.states = states
+        self.profiler = profiler
         self.inited = {k:False for k in self.states.keys()}
         for state in states.values(): # tell states to which manager they belong
             state.exit = self._state_exit() #type: ignore
@@ -170,21 +298,35 @@ class StackStateManager():
         if not self._current_state:
             assert state in self.states, "Start state has to be in managers states"
             self._current_state = state #type: ignore
-            self.current_state().on_init()
+            with self._measure(f"{state}.on_init","loading"):
+                self.current_state().on_init()
             self.inited[self._current_state] = True #type: ignore
     def __call__(self,dt:float,s:Surface)->None:
         self.update(dt)
         self.draw(s)
+    def _measure(self,name:str,category:str):
+        return nullcontext() if self.profiler is None else self.profiler.measure(name,category)
     def update(self,dt:float)->None:
         if not self._current_state:
             raise Exception("StateManager wasn't started yet")
         else:
-            self.active_state().update(dt)
+            if self.profiler is not None:
+                self.profiler.frame()
+            with self._measure(f"{self._active_state}.update","update"):
+                self.active_state().update(dt)
+    def handle_event(self,event:Event)->None:
+        if not self._current_state:
+            raise Exception("StateManager wasn't started yet")
+        else:
+            self.active_state().handle_event(event)
     def draw(self,s:Surface)->None:
         if not self._current_state:
             raise Exception("StateManager wasn't started yet")
         else:
-            self.active_state().draw(s)
+            with self._measure(f"{self._active_state}.draw","draw"):
+                self.active_state().draw(s)
+            if self.profiler is not None and self.profiler.overlay:
+                self.profiler.draw_overlay(s,self._active_state)
     def peek_state(self):
         elem = self.pop_state()
         if elem is not None:
@@ -193,7 +335,8 @@ class StackStateManager():
     def push_state(self,state:str):
         self._state_stack.append(state)
         if not self.inited[state]:
-            self.states[state].on_init()
+            with self._measure(f"{state}.on_init","loading"):
+                self.states[state].on_init()
     def pop_state(self):
         try:
             return self._state_stack.pop()
@@ -216,11 +359,15 @@ class StackStateManager():
             self.start(state)
         else:
             assert state in self.states and state is not None,"State invalid "+state
-            self.current_state().on_exit(to=state)
-            last_state = self._current_state
-            self._current_state = state
-            if not self.inited[state]:
-                self.current_state().on_init()
-            self.current_state().on_enter(frm=last_state,**kwargs)
+            with self._measure(f"{self._current_state}->{state}","transition"):
+                with self._measure(f"{self._current_state}.on_exit","loading"):
+                    self.current_state().on_exit(to=state)
+                last_state = self._current_state
+                self._current_state = state
+                if not self.inited[state]:
+                    with self._measure(f"{state}.on_init","loading"):
+                        self.current_state().on_init()
+                with self._measure(f"{state}.on_enter","loading"):
+                    self.current_state().on_enter(frm=last_state,**kwargs)
     def current_state_str(self):return self._current_state
     def active_state_str(self): return self._active_state
@@ -1,18 +1,40 @@
-from functools import cache
+import os
 import pygame as pg
 from pygame.font import SysFont
 from StateManager import State
-from random import choice
 from collections import OrderedDict
 from GameSudokuBoard import GameSudokuBoard as GSB
 from Button import TextButton
-from _utils import draw_text, BLACK, Surface
+from _utils import draw_text, BLACK, Surface, Optional
 from itertools import islice
+from Corpus import Corpus
+from PuzzleStore import PuzzleStoreReader, open_puzzles
+from Rating import RatingIndex, typical_score
+from functools import partial
+from random import Random, getrandbits
+from PuzzleQueue import PuzzleQueue, ReadyPuzzle
+import SaveGame
+import Transform
+
+MENU_DIFFICULTIES = ["Easy","Medium","Hard"]
+CLOCK_TICK = pg.event.custom_type() # posted every second while a game runs, so the loop wakes up to redraw the clock
 
 class PlayState(State):
     finished = False
-    unlocked = True
+    likely_next = ("pause","menu")
+    queue_depth = 2 # ready puzzles per difficulty
+    transform_puzzles = True # play every puzzle in a random equivalent form (see Transform.py)
+    save_path = "data/autosave.sdsv"
+    diff = MENU_DIFFICULTIES[0] # the difficulty of the current game
+    transform_seed: Optional[int] = None # the current game is puzzle.index in the form of Transform.from_seed(transform_seed)
+    elapsed = 0.0 # playing time in ms
+    _shown_time: Optional[str] = None # the timer text on the screen
     def on_init(self):
+        # own streams for the queue thread and the transforms, seeded from the global one so a seeded run repeats
+        self.queue = PuzzleQueue(self.pick_puzzle, depth=self.queue_depth, solutions=True, seed=getrandbits(64))
+        self.transform_seeds = Random(getrandbits(64))
+        self.autosaver = SaveGame.Autosaver(self.save_path)
+        self.timer_font = SysFont(None,40)
         self.board_kwargs = {
             "pos":pg.Vector2(pg.display.get_surface().get_rect().center)-(400,400),
             "color":(120,10,30),
@@ -27,29 +49,79 @@ class PlayState(State):
         self.menu_button = TextButton("Back to Menu", rect, menu_click)
         rect.y += 200
         self.restart_button = TextButton("Restart", rect, self.restart_game)
+        self.timer_rect = pg.rect.Rect(0,0,200,50)
+        self.timer_rect.center = cx,self.board_kwargs["pos"][1]/2
     def on_enter(self,frm: str,**kwargs):
         if frm == "menu":
             self.finished = False
-            self.diff=kwargs.get("difficulty")
-            self.board_kwargs["board"]=self.new_board()
-            self.board=GSB(**self.board_kwargs)
-        elif frm == "pause":
-            self.unlocked = False
-    def update(self,_):
+            self.elapsed = 0
+            if not (kwargs.get("resume") and self.resume_game()):
+                # without a usable save a new game of the last difficulty starts
+                self.diff=kwargs.get("difficulty",self.diff)
+                self.board_kwargs["board"]=self.new_board()
+                self.board_kwargs["solution"]=self.puzzle.solution
+                self.board=GSB(**self.board_kwargs)
+            self._shown_time = None
+        self.run_clock(not self.finished)
+    def on_exit(self,to: str):
+        self.run_clock(False)
+        if not self.finished:
+            self.autosave()
+        self.autosaver.flush()
+    def run_clock(self,running:bool):
+        """ Starts or stops the CLOCK_TICK events. The game loop sleeps without input, they wake it once the shown second changes """
+        pg.time.set_timer(CLOCK_TICK,1000 if running else 0)
+    def resume_game(self)->bool:
+        """ Continues the saved game. Returns False if there is none """
+        save = SaveGame.read(self.save_path)
+        if save is None: return False
+        self.diff = save.difficulty
+        givens = save.givens()
+        self.puzzle = ReadyPuzzle(save.difficulty,save.index,GSB.unflatten(givens),None)
+        self.transform_seed = save.transform
+        self.board_kwargs["board"]=self.puzzle.board
+        self.board_kwargs["solution"]=None
+        self.board=GSB(**self.board_kwargs)
+        self.board.restore(save.cells,save.notes)
+        self.elapsed = save.elapsed
+        return True
+    def snapshot(self)->SaveGame.SaveGame:
+        preset = [False]*self.board.geometry.cells
+        for x,y in self.board.preset:
+            preset[x*self.board.n+y] = True
+        return SaveGame.SaveGame(self.diff,self.puzzle.index,int(self.elapsed),bytes(self.board.flat()),self.board.note_masks(),preset,
+            self.transform_seed)
+    def autosave(self):
+        """ Hands a snapshot to the autosaver, which writes it in the background once the input settles """
+        self.autosaver.schedule(self.snapshot())
+    def update(self,dt):
+        if not self.finished:
+            self.elapsed += dt
+            self.board.update()
+    def handle_event(self,event):
+        if event.type == CLOCK_TICK:
+            return # update counts the time
         if self.finished:
-            if any(x for x in pg.key.get_pressed() if x in [pg.K_RETURN,pg.K_SPACE]):
+            if event.type == pg.KEYDOWN and event.key in (pg.K_RETURN,pg.K_SPACE):
                 self.restart_game()
-            self.menu_button.update()
-            self.restart_button.update()
-        else:
-            self.board.update()
-            if pg.key.get_pressed()[pg.K_p]:
-                if self.unlocked:
-                    self.exit("pause")
             else:
-                self.unlocked = True
+                self.menu_button.handle_event(event)
+                self.restart_button.handle_event(event)
+        elif event.type == pg.KEYDOWN and event.key == pg.K_p:
+            self.exit("pause")
+        else:
+            changes = self.board.changes
+            self.board.handle_event(event)
+            if self.board.changes != changes and not self.finished:
+                self.autosave()
+    def timer_text(self)->str:
+        minutes,seconds = divmod(int(self.elapsed)//1000,60)
+        return f"{minutes//60}:{minutes%60:02}:{seconds:02}" if minutes >= 60 else f"{minutes:02}:{seconds:02}"
     def draw(self,s:Surface):
         self.board.draw(s)
+        self._shown_time = self.timer_text()
+        s.fill(pg.Color("white"),self.timer_rect)
+        draw_text(s,self._shown_time,self.timer_font,BLACK,center=self.timer_rect.center)
         if self.finished:
             x,y=self.board.draw_pos
             w=h=self.board.size
@@ -59,16 +131,31 @@ class PlayState(State):
             s.blit(trans_rect,(x,y))
             self.menu_button.draw(s)
             self.restart_button.draw(s)
+    def dirty_rects(self):
+        if self.finished:return None
+        rects = self.board.changed_rects()
+        if self.timer_text() != self._shown_time:
+            rects.append(self.timer_rect)
+        return rects
     def on_finished(self):
         self.finished = True
+        self.run_clock(False)
+        self.autosaver.discard()
     def restart_game(self):
         self.finished=False
+        self.elapsed=0
         self.reset_board()
-    @cache
-    def get_sudoku(self,path:str)->list[str]:
-        with open("data/"+path,"r") as f:
-            lines=f.readlines()
-        return [line.strip() for line in lines if not line.startswith("#") and line.strip()]
+        self.run_clock(True)
+        self.autosaver.discard()
+    def get_sudoku(self,path:str)->Corpus|PuzzleStoreReader:
+        """ Prefers the packed store of a file (see PuzzleStore.convert) over the text file """
+        return open_puzzles("data/"+path)
+    def load_puzzles(self,diff:str):
+        """ Opens the puzzle file of a difficulty and its rating index and starts keeping puzzles of it ready """
+        RatingIndex.open(self.get_sudoku(self.diff_dict[diff]).path)
+        self.queue.watch(diff)
+    def resources(self):
+        return [partial(self.load_puzzles,diff) for diff in MENU_DIFFICULTIES]
     diff_dict=OrderedDict(zip(
         ["Easy","Medium","Hard","Magical","Hardest","Diabolic","Impossible"],
         ["puzzles0_kaggle",
@@ -79,8 +166,31 @@ class PlayState(State):
         "puzzles6_forum_hardest_1106",
         "puzzles7_serg_benchmark"]
     ))
+    # the hardest technique of the rating ladder (see Rating.py) a puzzle of a difficulty should need. If the file
+    # of a difficulty is rated, puzzles are picked close to the typical score of that technique
+    target_techniques={"Easy":"Hidden Single","Medium":"Locked Candidates","Hard":"Hidden Pair","Magical":"Hidden Triple",
+        "Hardest":"X-Wing","Diabolic":"Swordfish","Impossible":"Trial"}
+    target_scores={diff:typical_score(technique) for diff,technique in target_techniques.items()}
+    def pick_puzzle(self,diff:str,rng:Random)->tuple[int,str]:
+        """ The index and literal of a puzzle of the difficulty picked with rng, close to its target score if the file is rated """
+        puzzles=self.get_sudoku(self.diff_dict[diff])
+        ratings=RatingIndex.open(puzzles.path)
+        i=None
+        if ratings is not None and len(ratings)==len(puzzles):
+            i=ratings.pick(self.target_scores[diff],rng)
+        if i is None:
+            i=rng.randrange(len(puzzles))
+        return i,puzzles[i]
     def new_board(self):
-        return GSB.parse_literal(choice(self.get_sudoku(self.diff_dict[self.diff])))
+        puzzle=self.queue.get(self.diff)
+        self.transform_seed=None
+        if self.transform_puzzles:
+            self.transform_seed=self.transform_seeds.getrandbits(64)
+            transform=Transform.from_seed(self.transform_seed)
+            puzzle=puzzle._replace(board=transform.apply_board(puzzle.board),
+                solution=puzzle.solution and transform.apply_board(puzzle.solution))
+        self.puzzle=puzzle
+        return self.puzzle.board
     def reset_board(self):
         rename={
             "draw_pos":"pos",
@@ -94,37 +204,53 @@ class PlayState(State):
         }
         self.board_kwargs={k:v for _k,v in self.board.__dict__.items() if (k:=rename.get(_k))}
         self.board_kwargs["board"]=self.new_board()
+        self.board_kwargs["solution"]=self.puzzle.solution
         self.board_kwargs["on_finished"]=self.on_finished
         self.board=GSB(**self.board_kwargs)
     def get_board_center(self):
         return tuple(pos+self.board_kwargs["size"]/2 for pos in self.board_kwargs["pos"])
 
 class MainMenuState(State):
+    likely_next = ("play",)
     def __init__(self):        
         self.titleFont = SysFont(None,100)
         self.bigFont = SysFont(None,40)
     def on_init(self):
         self.buttons: list[TextButton] = []
         srect = pg.display.get_surface().get_rect()
-        for i,v in enumerate(["Easy","Medium","Hard"]):
+        for i,v in enumerate(MENU_DIFFICULTIES):
             rect = pg.rect.Rect(0,300+i*150,300,100)
             rect.centerx = srect.centerx
             self.buttons.append(TextButton(v,rect,self.button_click,font=self.bigFont,difficulty=v))
+        rect = pg.rect.Rect(0,300+len(MENU_DIFFICULTIES)*150,300,100)
+        rect.centerx = srect.centerx
+        self.continue_button = TextButton("Continue",rect,self.continue_click,font=self.bigFont)
+        self.can_continue = os.path.exists(PlayState.save_path)
+
+    def on_enter(self,frm: str,**kwargs):
+        self.can_continue = os.path.exists(PlayState.save_path)
 
     def button_click(self,button):
         self.exit("play",difficulty=button.difficulty)
 
-    def update(self,_):
+    def continue_click(self):
+        self.exit("play",resume=True)
+
+    def handle_event(self,event):
         for button in self.buttons:
-            button.update()
+            button.handle_event(event)
+        if self.can_continue:
+            self.continue_button.handle_event(event)
     
     def draw(self, screen: pg.surface.Surface):
         draw_text(screen,"Main Menu", self.titleFont, BLACK, center=(screen.get_rect().centerx,180))
         for button in self.buttons:
             button.draw(screen)
+        if self.can_continue:
+            self.continue_button.draw(screen)
 
 class PauseState(State):
-    unlocked = False
+    likely_next = ("play","menu")
     def on_init(self):
         cx = pg.display.get_surface().get_rect().centerx
         self.titleFont = SysFont(None,70)
@@ -138,17 +264,13 @@ class PauseState(State):
         self.menu_button = TextButton("Main Menu",rect, self.menu)
     def on_enter(self, frm: str, **kwargs):
         assert frm=="play", f"Can only pause from play state. Got: {frm}"
-        self.unlocked = False
-    def update(self, _):
-        if pg.key.get_pressed()[pg.K_p]:
-            if self.unlocked:
-                return self.resume()
-        else:
-            self.unlocked = True
-        if any(pg.mouse.get_pressed()) and not self.screen_rect.collidepoint(pg.mouse.get_pos()):
+    def handle_event(self, event):
+        if event.type == pg.KEYDOWN and event.key == pg.K_p:
+            return self.resume()
+        if event.type == pg.MOUSEBUTTONDOWN and not self.screen_rect.collidepoint(event.pos):
             return self.resume()
-        self.menu_button.update()
-        self.resume_button.update()
+        self.menu_button.handle_event(event)
+        self.resume_button.handle_event(event)
     def draw(self,s:Surface):
         """ Draw a golden overlay in the center of the screen
         on top of which there is the paused title, the resume button and the menu button """
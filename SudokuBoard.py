@@ -1,24 +1,121 @@
+import re
+from math import isqrt
 from random import randint
-from copy import copy
 from _utils import board_like, Board, Index2D, Iterable, Optional
+from CompactBoard import CompactBoard
+import Solver
+import DancingLinks
+
+# one character per number in compact literals of boards with up to 35 numbers, A is 10
+DIGITS = "123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_DIGIT_VALUES = {".":0,"0":0,**{c:num for num,c in enumerate(DIGITS,1)}}
+_SEPARATORS = re.compile(r"[,\s]+")
+
+def parse_cells(lit:str)->list[int]:
+    """The flat cells (index x*n+y) of a literal of any board size, "." and "0" are empty.
+    Numbers are either one character each (1-9, then A for 10 and so on, the classic 81 character literal is such one)
+    or separated by commas or whitespace, which allows multi-character numbers like "12,.,3,16,...".
+    Raises ValueError if the literal doesn't describe a board"""
+    lit=lit.strip()
+    if len(lit)==81:
+        return list(CompactBoard.from_literal(lit).cells)
+    if _SEPARATORS.search(lit):
+        tokens=_SEPARATORS.split(lit)
+        try:
+            cells=[0 if token=="." else int(token) for token in tokens]
+        except ValueError:
+            raise ValueError(f"Invalid sudoku literal: {lit!r}") from None
+    else:
+        try:
+            cells=[_DIGIT_VALUES[c.upper()] for c in lit]
+        except KeyError:
+            raise ValueError(f"Invalid sudoku literal: {lit!r}") from None
+    try:
+        n=Solver.geometry_of(len(cells)).n
+    except ValueError:
+        raise ValueError(f"Invalid sudoku literal: {lit!r}") from None
+    if not all(0<=num<=n for num in cells):
+        raise ValueError(f"Invalid sudoku literal: {lit!r}")
+    return cells
+
+def to_literal(cells:list[int])->str:
+    """The literal of flat cells: the classic one for boards with up to 9 numbers, comma separated numbers for bigger ones"""
+    if len(cells)<=81:
+        return "".join(str(num) if num else "." for num in cells)
+    return ",".join(str(num) if num else "." for num in cells)
 
 class SudokuBoard:
-    def __init__(self,board:Optional[Board]=None):
-        if board is None:board = self.empty_board()
-        assert len(board)==9
-        for column in board:assert len(column)==9
-        self.board:Board = copy(board)
+    def __init__(self,board:Optional[Board|CompactBoard]=None,box:int=3):
+        """board is a list of n columns of n numbers each (n is 9, 16, 25...), box is only used for an empty board"""
+        if board is None:board = self.empty_board(box*box)
+        elif isinstance(board,CompactBoard):board = board.to_board()
+        self.n=len(board)
+        assert isqrt(self.n)**2==self.n and self.n, "The side of a board has to be a square number"
+        for column in board:assert len(column)==self.n
+        self.geometry=Solver.geometry(isqrt(self.n))
+        self.board:Board = [list(column) for column in board]
+        self._count_units()
+    def _count_units(self):
+        """Builds the occupancy state that put_number keeps up to date:
+        unit_counts[u*(n+1)+num] counts num in unit u (see Solver.Geometry), used[u] is the digit mask of unit u,
+        duplicates is the number of surplus entries over all units and empty the number of empty fields"""
+        self.unit_counts=[0]*(3*self.n*(self.n+1))
+        self.used=[0]*(3*self.n)
+        self.duplicates=0
+        self.empty=self.geometry.cells
+        for x,y,num in self.iterate_board():
+            self._add_number(num,x*self.n+y)
+    def _add_number(self,number:int,i:int):
+        self.empty-=1
+        stride=self.n+1
+        for u in self.geometry.cell_units[i]:
+            k=u*stride+number
+            if self.unit_counts[k]:
+                self.duplicates+=1
+            else:
+                self.used[u]|=self.geometry.bits[number]
+            self.unit_counts[k]+=1
+    def _remove_number(self,number:int,i:int):
+        self.empty+=1
+        stride=self.n+1
+        for u in self.geometry.cell_units[i]:
+            k=u*stride+number
+            self.unit_counts[k]-=1
+            if self.unit_counts[k]:
+                self.duplicates-=1
+            else:
+                self.used[u]&=~self.geometry.bits[number]
     def get_number(self,position:Index2D)->int:
         x,y = position
         return self.board[x][y]
     def put_number(self,number:int,position:Index2D)->Board:
         x,y = position
-        self.board[x][y]=number
+        old=self.board[x][y]
+        if old!=number:
+            if old:self._remove_number(old,x*self.n+y)
+            if number:self._add_number(number,x*self.n+y)
+            self.board[x][y]=number
         return self.board
     def release_number(self,position:Index2D)->Board:
+        return self.put_number(0,position)
+    def candidate_mask(self,position:Index2D)->int:
+        """The n-bit mask of the numbers that don't appear in the column, row or box of position"""
         x,y = position
-        self.board[x][y]=0
-        return self.board
+        c,r,b = self.geometry.cell_units[x*self.n+y]
+        return self.geometry.all & ~(self.used[c]|self.used[r]|self.used[b])
+    def candidates(self,position:Index2D)->set[int]:
+        mask=self.candidate_mask(position)
+        return {num for num in range(1,self.n+1) if mask & self.geometry.bits[num]}
+    def has_conflict(self,position:Index2D)->bool:
+        """Whether the number at position appears again in its column, row or box"""
+        x,y = position
+        num=self.board[x][y]
+        return bool(num) and any(self.unit_counts[u*(self.n+1)+num]>1 for u in self.geometry.cell_units[x*self.n+y])
+    def conflicts(self)->Iterable[Index2D]:
+        """All fields whose number appears more than once in one of their units"""
+        if self.duplicates:
+            for x,y,_ in self.iterate_board():
+                if self.has_conflict((x,y)):yield (x,y)
     def field_occupied(self,position:Index2D)->bool:
         x,y = position
         return not self.board[x][y] == 0
@@ -31,61 +128,74 @@ class SudokuBoard:
         for x,column in enumerate(board):
             for y,num in enumerate(column):
                 if withEmpty or num:yield (x,y,num)
+    def compact(self)->CompactBoard:
+        return CompactBoard.from_board(self.board)
     def print_literal(self,board=None)->str:
-        board=board or None
-        def yielder():
-            for x,column in enumerate(board):
-                for y,num in enumerate(column):
-                    if num: yield str(num) 
-                    else: yield "."
-        return "".join(yielder())
+        """See to_literal, boards with more than 9 numbers get comma separated numbers"""
+        board=board or self.board
+        return to_literal([num for column in board for num in column])
     def boxes(self)->Iterable[list[int]]:
-        for boxi in range(9):
-            dx:int=boxi % 3 * 3
-            dy:int=boxi // 3 * 3
-            yield [self.board[x+dx][y+dy] for x in range(3) for y in range(3)]
+        box=self.geometry.box
+        for boxi in range(self.n):
+            dx:int=boxi % box * box
+            dy:int=boxi // box * box
+            yield [self.board[x+dx][y+dy] for x in range(box) for y in range(box)]
     def rows(self)->Board:
         return list(zip(*self.board))
     @staticmethod
-    def box_from_index(position:Index2D)->int:
+    def box_from_index(position:Index2D,box:int=3)->int:
         x,y = position
-        dx=x//3
-        dy=y//3
-        return dy*3 + dx
+        dx=x//box
+        dy=y//box
+        return dy*box + dx
     @staticmethod
-    def box_as_indices(boxi:int)->list[Index2D]:
-        dx:int=boxi % 3 * 3
-        dy:int=boxi // 3 * 3
-        return [(x+dx,y+dy) for x in range(3) for y in range(3)]
+    def box_as_indices(boxi:int,box:int=3)->list[Index2D]:
+        dx:int=boxi % box * box
+        dy:int=boxi // box * box
+        return [(x+dx,y+dy) for x in range(box) for y in range(box)]
     def checkFinished(self)->bool:
-        return not list(self.findNumber(0)) and self.checkValid()
-    def checkValid(self)->bool: 
-        return all(self.list_is_set(collumn) for collumn in self.board) and all(self.list_is_set(row) for row in self.rows()) and all(self.list_is_set(box) for box in self.boxes())
+        return not self.empty and not self.duplicates
+    def checkValid(self)->bool:
+        return not self.duplicates
+    def flat(self)->list[int]:
+        """The board as a flat list of n*n numbers (index x*n+y)"""
+        return [num for column in self.board for num in column]
+    @staticmethod
+    def unflatten(cells:Iterable[int])->Board:
+        """Inverse of flat"""
+        cells=list(cells)
+        n=isqrt(len(cells))
+        return [cells[x*n:x*n+n] for x in range(n)]
+    def solve(self)->Optional[Board]:
+        """Returns the solved board or None if there is no solution. The board itself stays untouched"""
+        if self.duplicates:return None
+        solution=Solver.solve(self.flat())
+        return solution and self.unflatten(solution)
+    def count_solutions(self,limit:int=2)->int:
+        """Counts the solutions of the board up to limit (with Dancing Links for 9x9 boards, stops early)"""
+        if self.duplicates:return 0
+        if self.n!=9:return Solver.count_solutions(self.flat(),limit)
+        return DancingLinks.count_solutions(self.flat(),limit)
+    def has_unique_solution(self)->bool:
+        return self.count_solutions(2)==1
     @classmethod
-    def deiterate_board(cls,iterator1d:Iterable[tuple[int,int,int]])->Board:
+    def deiterate_board(cls,iterator1d:Iterable[tuple[int,int,int]],n:int=9)->Board:
         """Inverse of iterate_board. Takes an Iterator with a x,y,num tuple and returns a Board"""
-        board=cls.empty_board()
+        board=cls.empty_board(n)
         for xyn in iterator1d:
             x,y,number=xyn
             board[x][y]=number
         return board
     @classmethod
     def parse_literal(cls, lit:str)->Board:
-        board = cls.empty_board()
-        for i,char in enumerate(lit):
-            if char==".":
-                num=0
-            else:
-                num=int(char)
-            x,y=i//9,i%9
-            board[x][y]=num
-        return board
+        """See parse_cells, the size of the board follows from the literal"""
+        return cls.unflatten(parse_cells(lit))
     @staticmethod
     def list_is_set(l:list[int])->bool: return len(l) == len(set(l)) #we can only do this because we only have integers guaranteed
     @staticmethod
-    def random_full_board()->Board: return board_like(lambda _,__:randint(1,9))
+    def random_full_board(n:int=9)->Board: return board_like(lambda _,__:randint(1,n),n)
     @staticmethod
-    def random_board()->Board: return board_like(lambda _,__:randint(0,9))
+    def random_board(n:int=9)->Board: return board_like(lambda _,__:randint(0,n),n)
     @staticmethod
-    def empty_board()->Board:return board_like(lambda _,__:0)
+    def empty_board(n:int=9)->Board:return board_like(lambda _,__:0,n)
 
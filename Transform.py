@@ -0,0 +1,87 @@
+"""Validity and difficulty preserving transforms of puzzles.
+
+    py Transform.py data/puzzles0_kaggle -n 3 --seed 7    # 3 transformed variants of every puzzle
+
+A transform relabels the digits, swaps columns within their stacks and stacks, rows within their bands and bands,
+and optionally transposes the board. Every transform maps solutions of a puzzle to solutions of the transformed one,
+so uniqueness and the solving techniques (and with them the rating) stay the same.
+A 9x9 puzzle has 9!*6^8*2 (over 10^12) transforms, a seed picks one of them."""
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT","1")
+import sys
+from argparse import ArgumentParser
+from math import isqrt
+from random import Random
+from typing import NamedTuple, Sequence
+from SudokuBoard import parse_cells, to_literal
+from _utils import Board
+
+class Transform(NamedTuple):
+    digits: tuple[int,...] # digits[d] is the new digit of d, digits[0] is 0
+    cells: tuple[int,...] # cells[i] is the flat index (x*n+y) of the old cell that moves to i
+
+    def apply(self,cells:Sequence[int])->list[int]:
+        """ The transformed flat board """
+        digits = self.digits
+        return [digits[cells[i]] for i in self.cells]
+
+    def apply_board(self,board:Board)->Board:
+        n = len(board)
+        cells = self.apply([num for column in board for num in column])
+        return [cells[x*n:x*n+n] for x in range(n)]
+
+    def inverse(self)->"Transform":
+        digits,cells = [0]*len(self.digits),[0]*len(self.cells)
+        for d,new in enumerate(self.digits):
+            digits[new] = d
+        for i,old in enumerate(self.cells):
+            cells[old] = i
+        return Transform(tuple(digits),tuple(cells))
+
+def _lines(rng:Random,box:int)->list[int]:
+    """ A permutation of the columns (or rows) that keeps them in their stacks (bands) """
+    blocks = list(range(box))
+    rng.shuffle(blocks)
+    lines = []
+    for block in blocks:
+        inner = list(range(box))
+        rng.shuffle(inner)
+        lines.extend(block*box+k for k in inner)
+    return lines
+
+def from_seed(seed:int|str,box:int=3)->Transform:
+    """ The transform of a seed, the same seed always gives the same transform """
+    rng = Random(seed)
+    n = box*box
+    digits = list(range(1,n+1))
+    rng.shuffle(digits)
+    columns,rows = _lines(rng,box),_lines(rng,box)
+    transpose = rng.random() < 0.5
+    cells = []
+    for x in range(n):
+        for y in range(n):
+            ox,oy = (rows[y],columns[x]) if transpose else (columns[x],rows[y])
+            cells.append(ox*n+oy)
+    return Transform((0,*digits),tuple(cells))
+
+def main():
+    parser = ArgumentParser(description="Writes transformed variants of puzzles, they are equivalent to the original ones")
+    parser.add_argument("path", help="text file with one literal per line")
+    parser.add_argument("-n","--count",type=int,default=1,help="variants per puzzle")
+    parser.add_argument("-s","--seed",default="0",help="seed of the transforms")
+    parser.add_argument("-o","--output",help="defaults to stdout")
+    args = parser.parse_args()
+    out = open(args.output,"w") if args.output else sys.stdout
+    try:
+        with open(args.path) as f:
+            lines = (line.strip() for line in f)
+            for k,line in enumerate(line for line in lines if line and not line.startswith("#")):
+                cells = parse_cells(line)
+                box = isqrt(isqrt(len(cells)))
+                for i in range(args.count):
+                    out.write(to_literal(from_seed(f"{args.seed}:{k}:{i}",box).apply(cells))+"\n")
+    finally:
+        if out is not sys.stdout: out.close()
+
+if __name__ == "__main__":
+    main()
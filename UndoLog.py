@@ -0,0 +1,139 @@
+"""Bounded undo/redo log of board changes.
+
+Every change of a field is one delta packed into a 64 bit int: the flat cell (7 bits), the old and new number (4 bits each),
+the old and new note mask (9 bits each, bit n-1 for note n) and a bit that marks the first delta of an action.
+The deltas live in a ring buffer. Once it is full the oldest delta is folded into the base position,
+so the log can always rebuild every position from the base onwards.
+Bigger boards get wider fields (see Layout), their deltas go into a list of ints once they don't fit 64 bits anymore."""
+from array import array
+from contextlib import contextmanager
+from math import isqrt
+from typing import Iterator, NamedTuple, Optional, Sequence
+
+class Delta(NamedTuple):
+    cell: int # flat index x*n+y
+    old: int
+    new: int
+    old_notes: int
+    new_notes: int
+
+GROUP_START = 1 << 33
+
+def pack(delta:Delta,group_start:bool=False)->int:
+    cell,old,new,old_notes,new_notes = delta
+    return cell | old << 7 | new << 11 | old_notes << 15 | new_notes << 24 | (GROUP_START if group_start else 0)
+
+def unpack(packed:int)->Delta:
+    return Delta(packed & 0x7F, packed >> 7 & 0xF, packed >> 11 & 0xF, packed >> 15 & 0x1FF, packed >> 24 & 0x1FF)
+
+class Layout:
+    """ The bit fields of the deltas of a board with cells fields, n = sqrt(cells) numbers and n-bit note masks.
+    The layout of 81 cells is the one of pack and unpack """
+    def __init__(self,cells:int):
+        n = isqrt(cells)
+        self.cell_bits = max(1,(cells-1).bit_length())
+        self.num_bits = n.bit_length()
+        self.note_bits = n
+        self.shifts = [0]
+        for width in (self.cell_bits,self.num_bits,self.num_bits,self.note_bits):
+            self.shifts.append(self.shifts[-1]+width)
+        self.group_start = 1 << self.shifts[-1]+self.note_bits
+        self.masks = [(1 << width)-1 for width in (self.cell_bits,self.num_bits,self.num_bits,self.note_bits,self.note_bits)]
+    def pack(self,delta:Delta,group_start:bool=False)->int:
+        packed = self.group_start if group_start else 0
+        for value,shift in zip(delta,self.shifts):
+            packed |= value << shift
+        return packed
+    def unpack(self,packed:int)->Delta:
+        return Delta(*(packed >> shift & mask for shift,mask in zip(self.shifts,self.masks)))
+
+class UndoLog:
+    """ The deltas from start on are applied up to position, the ones after it can be redone """
+    def __init__(self,cells:Sequence[int],notes:Optional[Sequence[int]]=None,capacity:int=4096):
+        self.capacity = capacity
+        if len(cells) == 81:
+            self.pack,self.unpack,self.group_start = pack,unpack,GROUP_START
+        else:
+            layout = Layout(len(cells))
+            self.pack,self.unpack,self.group_start = layout.pack,layout.unpack,layout.group_start
+        self.deltas: array|list[int] = array("Q",bytes(8*capacity)) if self.group_start < 1 << 63 else [0]*capacity
+        self.start = 0 # ring index of the oldest delta
+        self.length = 0 # stored deltas
+        self.position = 0 # applied deltas
+        self.base_cells = bytearray(cells) # the position before the oldest delta
+        self.base_notes = array("H" if len(cells) == 81 else "L",notes or [0]*len(cells))
+        self._depth = 0
+        self._group_open = False
+
+    @contextmanager
+    def group(self):
+        """ All deltas recorded inside are undone and redone together """
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self._group_open = False
+
+    def record(self,delta:Delta)->None:
+        """ Appends a delta after the applied ones, which drops the redoable deltas. O(1) """
+        group_start = not (self._depth and self._group_open)
+        self._group_open = bool(self._depth)
+        self.length = self.position
+        if self.length == self.capacity: # fold the oldest delta into the base
+            oldest = self.unpack(self.deltas[self.start])
+            self.base_cells[oldest.cell] = oldest.new
+            self.base_notes[oldest.cell] = oldest.new_notes
+            self.start = (self.start+1) % self.capacity
+            self.length -= 1
+            self.position -= 1
+            # the next delta now opens the oldest action
+            self.deltas[self.start] |= self.group_start
+        self.deltas[(self.start+self.length) % self.capacity] = self.pack(delta,group_start)
+        self.length += 1
+        self.position += 1
+
+    def undo(self)->list[Delta]:
+        """ The deltas of the last applied action, newest first. Revert them in this order """
+        result = []
+        while self.position:
+            self.position -= 1
+            packed = self.deltas[(self.start+self.position) % self.capacity]
+            result.append(self.unpack(packed))
+            if packed & self.group_start: break
+        self._group_open = False
+        return result
+
+    def redo(self)->list[Delta]:
+        """ The deltas of the next undone action, oldest first. Apply them in this order """
+        result = []
+        while self.position < self.length:
+            result.append(self.unpack(self.deltas[(self.start+self.position) % self.capacity]))
+            self.position += 1
+            if self.position == self.length or self.deltas[(self.start+self.position) % self.capacity] & self.group_start: break
+        self._group_open = False
+        return result
+
+    def can_undo(self)->bool:
+        return self.position > 0
+    def can_redo(self)->bool:
+        return self.position < self.length
+
+    def __len__(self)->int:
+        return self.length
+
+    def __iter__(self)->Iterator[Delta]:
+        """ All stored deltas, oldest first (including the redoable ones) """
+        for k in range(self.length):
+            yield self.unpack(self.deltas[(self.start+k) % self.capacity])
+
+    def replay(self,n:Optional[int]=None)->tuple[bytearray,array]:
+        """ The cells and note masks after the first n stored deltas (default: the applied ones) """
+        n = self.position if n is None else n
+        cells,notes = bytearray(self.base_cells),array(self.base_notes.typecode,self.base_notes)
+        for k,delta in enumerate(self):
+            if k == n: break
+            cells[delta.cell] = delta.new
+            notes[delta.cell] = delta.new_notes
+        return cells,notes
@@ -1,4 +1,6 @@
 import pygame as pg
+import threading
+from collections import OrderedDict
 
 # typing
 from typing import Any, Callable, Iterable, Optional
@@ -51,9 +53,44 @@ def scale_image(s:Surface,factor:float)->Surface:
 def scale_image_to_width(s:Surface, aim_width:int)->Surface:
     return scale_image(s,aim_width/s.get_width())
 
+class TextCache:
+    """ A bounded LRU cache of rendered text surfaces keyed by (font, text, color, antialias).
+    The surfaces are shared, so don't draw on them """
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.surfaces: OrderedDict[tuple, Surface] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock() # states render while loading in their own threads
+    def render(self, font: Font, text: str, color: Color, antialias: bool = True)->Surface:
+        key = (font, text, tuple(color), antialias)
+        with self.lock:
+            surface = self.surfaces.get(key)
+            if surface is not None:
+                self.hits += 1
+                self.surfaces.move_to_end(key)
+                return surface
+            self.misses += 1
+        surface = font.render(text, antialias, color)
+        with self.lock:
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.maxsize:
+                self.surfaces.popitem(last=False)
+        return surface
+    def clear(self):
+        with self.lock:
+            self.surfaces.clear()
+            self.hits = self.misses = 0
+
+text_cache = TextCache()
+
+def render_text(font: Font, text: str, color: Color, antialias: bool = True)->Surface:
+    """ font.render through the shared text_cache """
+    return text_cache.render(font, text, color, antialias)
+
 def draw_text(screen:pg.surface.Surface, string: str, font: pg.font.Font, color: Color, **kwargs):
     """ kwargs are passed to get_rect of the text.
     Example `center=(100,100)`"""
-    text = font.render(string, True, color)
+    text = render_text(font, string, color)
     rect = text.get_rect(**kwargs)
     screen.blit(text,rect)
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""Solves whole puzzle files on all cores.
+
+    py batch_solve.py data/puzzles2_17_clue -o solutions.txt
+
+Puzzles are streamed in chunks to a process pool and the solutions are written in input order,
+one literal per line ("# no solution: <puzzle>" for failures). Statistics go to stderr."""
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT","1") # keep stdout clean for the solutions
+import sys
+import time
+from argparse import ArgumentParser
+from array import array
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+from CompactBoard import CompactBoard
+from Profiler import percentile
+from PuzzleStore import PuzzleStoreReader, SUFFIX
+import Solver
+
+def read_puzzles(path:str)->Iterator[str]:
+    """ Streams the puzzle literals of a text file or a puzzle store """
+    if path.endswith(SUFFIX):
+        yield from PuzzleStoreReader(path)
+        return
+    with open(path,"r") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+def chunked(it:Iterable[str],size:int)->Iterator[list[str]]:
+    it = iter(it)
+    while chunk := list(islice(it,size)):
+        yield chunk
+
+def solve_chunk(chunk:list[str])->list[tuple[str|None,float]]:
+    """ Solves a chunk of literals and returns the solution literal (or None) and the solve time of every puzzle """
+    results = []
+    for lit in chunk:
+        start = time.perf_counter()
+        try:
+            cells = Solver.solve(CompactBoard.from_literal(lit).cells)
+        except ValueError:
+            cells = None
+        solution = cells and CompactBoard(bytes(cells)).to_literal()
+        results.append((solution,time.perf_counter()-start))
+    return results
+
+def solve_file(path:str,out:TextIO,workers:int|None=None,chunk_size:int=256)->dict[str,float]:
+    """ Solves every puzzle of path, writes the solutions to out and returns the statistics """
+    latencies = array("d")
+    failures = 0
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as executor:
+        max_pending = 4*workers
+        pending: deque[tuple[list[str],Future]] = deque()
+        def flush_first():
+            nonlocal failures
+            chunk,future = pending.popleft()
+            for lit,(solution,latency) in zip(chunk,future.result()):
+                latencies.append(latency)
+                if solution is None:
+                    failures += 1
+                    out.write(f"# no solution: {lit}\n")
+                else:
+                    out.write(solution+"\n")
+        for chunk in chunked(read_puzzles(path),chunk_size):
+            pending.append((chunk,executor.submit(solve_chunk,chunk)))
+            if len(pending) >= max_pending:
+                flush_first()
+        while pending:
+            flush_first()
+    elapsed = time.perf_counter()-start
+    latencies = array("d",sorted(latencies))
+    return {
+        "puzzles": len(latencies),
+        "failures": failures,
+        "seconds": elapsed,
+        "puzzles_per_sec": len(latencies)/elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies,0.50)*1000,
+        "p99_ms": percentile(latencies,0.99)*1000,
+        "max_ms": (latencies[-1] if latencies else 0.0)*1000,
+    }
+
+def main():
+    parser = ArgumentParser(description="Solve whole puzzle files (text or packed store) in parallel")
+    parser.add_argument("path", help="puzzle file")
+    parser.add_argument("-o","--output", help="solution file (defaults to stdout)")
+    parser.add_argument("-j","--workers", type=int, help="number of processes (defaults to the number of cores)")
+    parser.add_argument("-c","--chunk-size", type=int, default=256, help="puzzles per task")
+    args = parser.parse_args()
+    out = open(args.output,"w") if args.output else sys.stdout
+    try:
+        stats = solve_file(args.path,out,args.workers,args.chunk_size)
+    finally:
+        if out is not sys.stdout: out.close()
+    print(f"{stats['puzzles']} puzzles in {stats['seconds']:.2f}s ({stats['puzzles_per_sec']:.0f} puzzles/s), "
+          f"p50 {stats['p50_ms']:.2f}ms, p99 {stats['p99_ms']:.2f}ms, max {stats['max_ms']:.2f}ms, "
+          f"{stats['failures']} failures", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
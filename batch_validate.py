@@ -0,0 +1,140 @@
+"""Validates whole puzzle files at once with NumPy.
+
+    py batch_validate.py data/puzzles2_17_clue.sdks
+    py batch_validate.py data/puzzles2_17_clue --solutions solutions.txt
+
+The puzzles are loaded into an (N,9,9) uint8 array indexed [puzzle,x,y] like the boards of the game
+(from a text file with one literal per line or from a puzzle store). Every unit is checked for duplicates with
+digit bitmasks, and solutions (from the store or a text file in input order, e.g. written by batch_solve.py)
+have to be complete, free of duplicates and agree with the givens of their puzzle.
+The result is a bool mask of the valid puzzles and a uint8 array of error flags per puzzle."""
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT","1")
+import sys
+from argparse import ArgumentParser
+from typing import Optional
+import numpy as np
+from PuzzleStore import HEADER, PACKED_SIZE, PuzzleStoreReader, SUFFIX
+
+# error flags
+MALFORMED = 1 # the line is no literal of 81 cells (or the store record has cells above 9)
+PUZZLE_DUPLICATE = 2 # a number appears twice in a unit of the puzzle
+SOLUTION_DUPLICATE = 4
+SOLUTION_INCOMPLETE = 8 # missing solution or empty cells in it
+SOLUTION_MISMATCH = 16 # a given of the puzzle differs from the solution
+ERRORS = {MALFORMED:"malformed",PUZZLE_DUPLICATE:"puzzle duplicate",SOLUTION_DUPLICATE:"solution duplicate",
+    SOLUTION_INCOMPLETE:"solution incomplete",SOLUTION_MISMATCH:"solution mismatch"}
+
+# byte of a literal -> cell value, 255 for bytes that are no cell
+_CELLS = np.full(256,255,dtype=np.uint8)
+_CELLS[ord(".")] = _CELLS[ord("0")] = 0
+_CELLS[np.frombuffer(b"123456789",dtype=np.uint8)] = np.arange(1,10,dtype=np.uint8)
+
+_BITS = np.array([0]+[1 << (d-1) for d in range(1,10)],dtype=np.uint16) # like Solver.BITS, empty cells have no bit
+_POPCOUNT = np.array([bin(mask).count("1") for mask in range(512)],dtype=np.uint8)
+
+def parse_literals(lines:list[bytes])->tuple[np.ndarray,np.ndarray]:
+    """ The (N,9,9) boards of the literals and a bool mask of the malformed ones (which are all zero) """
+    malformed = np.array([len(line) != 81 for line in lines],dtype=bool)
+    raw = np.frombuffer(b"".join(line if len(line) == 81 else bytes(81) for line in lines),dtype=np.uint8).reshape(-1,81)
+    cells = _CELLS[raw]
+    malformed |= (cells == 255).any(axis=1)
+    cells[malformed] = 0
+    return cells.reshape(-1,9,9),malformed
+
+def read_text(path:str)->tuple[np.ndarray,np.ndarray]:
+    """ The literals of a text file (# comments and empty lines skipped).
+    "# no solution" lines of batch_solve.py count as malformed entries, so solutions stay aligned with their puzzles """
+    lines = []
+    with open(path,"rb") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(b"# no solution"):
+                lines.append(b"")
+            elif line and not line.startswith(b"#"):
+                lines.append(line)
+    return parse_literals(lines)
+
+def unpack_records(data:np.ndarray)->tuple[np.ndarray,np.ndarray]:
+    """ (N,41) packed cells (see PuzzleStore.pack) -> (N,9,9) boards and a bool mask of the corrupt records,
+    the ones with a nibble above 9 (which are all zero, like malformed literals) """
+    cells = np.empty((len(data),2*PACKED_SIZE),dtype=np.uint8)
+    cells[:,0::2] = data >> 4
+    cells[:,1::2] = data & 0xF
+    cells = cells[:,:81]
+    malformed = (cells > 9).any(axis=1)
+    cells[malformed] = 0
+    return cells.reshape(-1,9,9),malformed
+
+def read_store(path:str)->tuple[tuple[np.ndarray,np.ndarray],Optional[tuple[np.ndarray,np.ndarray]]]:
+    """ The puzzles and (if stored) the solutions of a puzzle store, each with the mask of its corrupt records """
+    reader = PuzzleStoreReader(path)
+    records = np.frombuffer(reader.mm,dtype=np.uint8,offset=HEADER.size).reshape(len(reader),reader.record_size)
+    puzzles = unpack_records(records[:,:PACKED_SIZE])
+    solutions = unpack_records(records[:,PACKED_SIZE:]) if reader.has_solutions else None
+    return puzzles,solutions
+
+def units(boards:np.ndarray)->np.ndarray:
+    """ (N,9,9) boards -> (N,27,9) units in the order of Solver.UNITS (columns x, rows y, boxes) """
+    n = len(boards)
+    boxes = boards.reshape(n,3,3,3,3).transpose(0,3,1,4,2).reshape(n,9,9) # [n,by,bx,iy,ix] -> box by*3+bx
+    return np.concatenate((boards,boards.transpose(0,2,1),boxes),axis=1)
+
+def has_duplicates(boards:np.ndarray)->np.ndarray:
+    """ Whether a number appears twice in a unit, per board.
+    Without duplicates the digit masks of the 27 units have 3 bits per filled cell (one for its column, row and box) """
+    masks = np.bitwise_or.reduce(_BITS[units(boards)],axis=2)
+    bits = _POPCOUNT[masks].sum(axis=1,dtype=np.int32)
+    return bits != 3*np.count_nonzero(boards.reshape(len(boards),81),axis=1)
+
+def validate(puzzles:np.ndarray,solutions:Optional[np.ndarray]=None,malformed:Optional[np.ndarray]=None,
+        solution_malformed:Optional[np.ndarray]=None,chunk_size:int=1<<16)->tuple[np.ndarray,np.ndarray]:
+    """ Returns the valid mask and the error flags of all puzzles. Works in chunks to bound the memory """
+    errors = np.zeros(len(puzzles),dtype=np.uint8)
+    if malformed is not None:
+        errors[malformed] |= MALFORMED
+    if solutions is not None:
+        if len(solutions) != len(puzzles):
+            raise ValueError(f"{len(solutions)} solutions for {len(puzzles)} puzzles")
+        if solution_malformed is not None:
+            errors[solution_malformed] |= SOLUTION_INCOMPLETE
+    for start in range(0,len(puzzles),chunk_size):
+        part = slice(start,start+chunk_size)
+        p = puzzles[part]
+        errors[part][has_duplicates(p)] |= PUZZLE_DUPLICATE
+        if solutions is not None:
+            s = solutions[part]
+            errors[part][has_duplicates(s)] |= SOLUTION_DUPLICATE
+            errors[part][(s == 0).any(axis=(1,2))] |= SOLUTION_INCOMPLETE
+            errors[part][((p != 0) & (p != s)).any(axis=(1,2))] |= SOLUTION_MISMATCH
+    return errors == 0,errors
+
+def validate_file(path:str,solution_path:Optional[str]=None)->tuple[np.ndarray,np.ndarray]:
+    solutions = solution_malformed = None
+    if path.endswith(SUFFIX):
+        (puzzles,malformed),stored = read_store(path)
+        if stored is not None:
+            solutions,solution_malformed = stored
+    else:
+        (puzzles,malformed),solutions = read_text(path),None
+    if solution_path is not None:
+        solutions,solution_malformed = read_text(solution_path)
+    return validate(puzzles,solutions,malformed,solution_malformed)
+
+def main():
+    parser = ArgumentParser(description="Checks puzzle files (and their solutions) for malformed literals, duplicates and inconsistencies")
+    parser.add_argument("path", help="text puzzle file or puzzle store")
+    parser.add_argument("-s","--solutions", help="text file with one solution per puzzle (overrides the solutions of a store)")
+    parser.add_argument("-n","--show", type=int, default=10, help="invalid puzzles to list")
+    args = parser.parse_args()
+    valid,errors = validate_file(args.path,args.solutions)
+    print(f"{args.path}: {int(valid.sum())} of {len(valid)} valid")
+    for flag,name in ERRORS.items():
+        count = int(np.count_nonzero(errors & flag))
+        if count: print(f"  {name}: {count}")
+    for i in np.flatnonzero(~valid)[:args.show]:
+        print(f"  #{i}: "+", ".join(name for flag,name in ERRORS.items() if errors[i] & flag))
+    sys.exit(0 if valid.all() else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Reproducible benchmarks over the difficulty datasets of PlayState.diff_dict.
+
+    py benchmark.py run -o bench.json            # measure
+    py benchmark.py compare old.json new.json    # flag regressions
+
+Metrics ending in _ms or _us are better when lower, metrics ending in _per_sec are better when higher."""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER","dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT","1")
+import json
+import platform
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from random import Random
+from typing import Any, Callable
+import pygame as pg
+pg.init()
+from Corpus import Corpus
+from GameSudokuBoard import GameSudokuBoard
+import Generator
+from PuzzleStore import PuzzleStoreReader, SUFFIX
+from States import PlayState
+from SudokuBoard import SudokuBoard
+import Solver
+import Transform
+
+Metrics = dict[str,float]
+
+LARGE_BOARDS = {4:20,5:5} # box size: boards to solve
+LARGE_EMPTY = 0.55 # share of empty cells, the search is hardest around it
+
+def load_sample(data_dir:str,name:str,n:int,seed:int)->list[str]:
+    """ n puzzles of a dataset, the same ones for the same seed """
+    path = os.path.join(data_dir,name)
+    puzzles = PuzzleStoreReader(path+SUFFIX) if os.path.exists(path+SUFFIX) else Corpus(path)
+    indices = Random(seed).sample(range(len(puzzles)),min(n,len(puzzles)))
+    return [puzzles[i] for i in indices]
+
+def latency_metrics(latencies:list[float],prefix:str)->Metrics:
+    latencies = sorted(latencies)
+    def pct(p:float)->float: return latencies[min(len(latencies)-1,int(p*len(latencies)))]*1000
+    total = sum(latencies)
+    return {
+        f"{prefix}_per_sec": len(latencies)/total if total else 0.0,
+        f"{prefix}_mean_ms": total/len(latencies)*1000,
+        f"{prefix}_p50_ms": pct(0.5),
+        f"{prefix}_p95_ms": pct(0.95),
+        f"{prefix}_p99_ms": pct(0.99),
+        f"{prefix}_max_ms": latencies[-1]*1000,
+    }
+
+def timed(func:Callable,*args)->float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter()-start
+
+def bench_solve(puzzles:list[str])->Metrics:
+    flats = [SudokuBoard(SudokuBoard.parse_literal(p)).flat() for p in puzzles]
+    return latency_metrics([timed(Solver.solve,cells) for cells in flats],"solve")
+
+def large_boards(box:int,count:int,empty:float,seed:int)->list[list[int]]:
+    """ Flat boards of a box size: random full grids in a random equivalent form with a share of their cells emptied.
+    They are solvable but not necessarily uniquely """
+    boards = []
+    for i in range(count):
+        rng = Generator.rng_for(seed,i)
+        cells = Transform.from_seed(rng.getrandbits(64),box).apply(Generator.solution_grid(rng,box))
+        for j in rng.sample(range(len(cells)),int(empty*len(cells))):
+            cells[j] = 0
+        boards.append(cells)
+    return boards
+
+def bench_solve_large(box:int,count:int,empty:float,seed:int)->Metrics:
+    return latency_metrics([timed(Solver.solve,cells) for cells in large_boards(box,count,empty,seed)],"solve")
+
+def bench_validation(puzzles:list[str],repeat:int=20)->Metrics:
+    boards = [SudokuBoard(SudokuBoard.parse_literal(p)) for p in puzzles]
+    solved = [SudokuBoard(b.solve()) for b in boards[:50]]
+    def run(boards):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for board in boards:
+                board.checkValid()
+                board.checkFinished()
+        return (time.perf_counter()-start)/(repeat*len(boards))*1e6
+    return {"validate_us": run(boards), "validate_solved_us": run(solved)}
+
+def bench_draw(puzzle:str,frames:int=300)->Metrics:
+    screen = pg.display.set_mode((1200,1000))
+    board = GameSudokuBoard(SudokuBoard.parse_literal(puzzle),pos=(200,100),size=800,on_finished=lambda:None)
+    for x,y,num in board.iterate_board(withEmpty=True):
+        if not num: board.fill_notes((x,y))
+    board.selected_field = (4,4)
+    board.selected_num = 5
+    for _ in range(10): board.draw(screen) # warm up
+    return latency_metrics([timed(board.draw,screen) for _ in range(frames)],"draw")
+
+def bench_generator(seed:int,count:int=20)->Metrics:
+    """ Single process generator throughput and latency of Generator.make_puzzle """
+    return latency_metrics([timed(Generator.make_puzzle,Generator.rng_for(seed,i)) for i in range(count)],"generate")
+
+def machine_info()->dict[str,Any]:
+    def git(*args)->str:
+        try:
+            return subprocess.run(["git",*args],capture_output=True,text=True,cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except OSError:
+            return ""
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "pygame": pg.version.ver,
+        "git_revision": git("rev-parse","HEAD"),
+        "git_dirty": bool(git("status","--porcelain","--untracked-files=no")),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+def run(data_dir:str,n:int,seed:int,datasets:list[str])->dict[str,Any]:
+    results: dict[str,Any] = {}
+    def record(key:str,func:Callable,*args):
+        print(f"{key}...",file=sys.stderr)
+        try:
+            results[key] = func(*args)
+        except Exception as e: # a missing dataset or a broken generator shouldn't cost the other results
+            results[key] = {"error": f"{type(e).__name__}: {e}"}
+    samples: dict[str,list[str]] = {}
+    for difficulty in datasets:
+        try:
+            samples[difficulty] = load_sample(data_dir,PlayState.diff_dict[difficulty],n,seed)
+        except OSError as e:
+            results[f"dataset/{difficulty}"] = {"error": f"{type(e).__name__}: {e}"}
+    for difficulty,puzzles in samples.items():
+        record(f"solve/{difficulty}",bench_solve,puzzles)
+        record(f"validate/{difficulty}",bench_validation,puzzles)
+    for box,count in LARGE_BOARDS.items():
+        record(f"solve/{box*box}x{box*box}",bench_solve_large,box,count,LARGE_EMPTY,seed)
+    if samples:
+        record("draw",bench_draw,next(iter(samples.values()))[0])
+    record("generate",bench_generator,seed)
+    return {"machine": machine_info(), "config": {"puzzles": n, "seed": seed, "datasets": datasets}, "results": results}
+
+def compare(old:dict[str,Any],new:dict[str,Any],threshold:float)->list[str]:
+    """ Returns a line for every metric that got worse by more than threshold (relative) """
+    regressions = []
+    for key,new_metrics in new["results"].items():
+        old_metrics = old["results"].get(key,{})
+        for metric,new_value in new_metrics.items():
+            old_value = old_metrics.get(metric)
+            if not isinstance(new_value,(int,float)) or not isinstance(old_value,(int,float)) or not old_value:
+                continue
+            change = (new_value-old_value)/old_value
+            if metric.endswith("_per_sec"):
+                change = -change
+            elif not metric.endswith(("_ms","_us")):
+                continue
+            if change > threshold:
+                regressions.append(f"{key} {metric}: {old_value:.4g} -> {new_value:.4g} ({change:+.1%} worse)")
+    return regressions
+
+def main():
+    parser = ArgumentParser(description="Benchmark solver, validation, drawing and generation")
+    commands = parser.add_subparsers(dest="command",required=True)
+    run_parser = commands.add_parser("run",help="run the benchmarks")
+    run_parser.add_argument("-o","--output",help="JSON result file (defaults to stdout)")
+    run_parser.add_argument("-n","--puzzles",type=int,default=200,help="puzzles per dataset")
+    run_parser.add_argument("--seed",type=int,default=0)
+    run_parser.add_argument("--data",default="data",help="data directory")
+    run_parser.add_argument("--datasets",nargs="+",default=list(PlayState.diff_dict),choices=list(PlayState.diff_dict))
+    compare_parser = commands.add_parser("compare",help="flag regressions between two runs")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("-t","--threshold",type=float,default=0.1,help="relative change that counts as regression")
+    args = parser.parse_args()
+    if args.command == "run":
+        result = json.dumps(run(args.data,args.puzzles,args.seed,args.datasets),indent=2)
+        if args.output:
+            with open(args.output,"w") as f:
+                f.write(result)
+        else:
+            print(result)
+    else:
+        with open(args.old) as f: old = json.load(f)
+        with open(args.new) as f: new = json.load(f)
+        regressions = compare(old,new,args.threshold)
+        for line in regressions:
+            print(line)
+        print(f"{len(regressions)} regressions (threshold {args.threshold:.0%})")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Finds puzzles that are equivalent to each other across puzzle files.
+
+    py dedupe.py data/puzzles3_magictour_top1465 data/puzzles4_forum_hardest_1905 data/puzzles7_serg_benchmark
+    py dedupe.py data/puzzles* --index data/puzzles.sddx --remove
+
+The files are streamed in chunks to a process pool that computes the minlex canonical form (see Canonical.py)
+of every puzzle and hashes it to 64 bits. The hashes go into an on-disk hash table (open addressing, memory mapped),
+so later runs only have to canonicalize the new files. A puzzle is a duplicate if an equivalent one came earlier,
+in the same file, an earlier file or an earlier run. --remove rewrites the files without their duplicates."""
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT","1")
+import hashlib
+import mmap
+import struct
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, NamedTuple, Optional
+from Canonical import canonical_cells
+from CompactBoard import CompactBoard
+from Corpus import Corpus
+from PuzzleStore import PuzzleStoreReader, PuzzleStoreWriter, SUFFIX
+
+HEADER = struct.Struct("<4sBxxxQQ") # magic, version, capacity, count
+MAGIC = b"SDDX"
+VERSION = 1
+
+def key_of(lit:str)->int:
+    """ The 64 bit hash of the canonical form of a literal, 0 for malformed literals """
+    try:
+        cells = canonical_cells(CompactBoard.from_literal(lit).cells)
+    except ValueError:
+        return 0
+    return int.from_bytes(hashlib.blake2b(bytes(cells),digest_size=8).digest(),"little") or 1
+
+_opened: dict[str,tuple[int,Corpus|PuzzleStoreReader]] = {} # path: (mtime, puzzles)
+
+def open_file(path:str)->Corpus|PuzzleStoreReader:
+    """ The puzzles of exactly this file (unlike PuzzleStore.open_puzzles, which prefers a store next to a text file).
+    Every process maps a file once, like the shared readers of Corpus.open, but reopens it once --remove rewrote it """
+    mtime = os.stat(path).st_mtime_ns
+    if path not in _opened or _opened[path][0] != mtime:
+        _opened[path] = mtime,PuzzleStoreReader(path) if path.endswith(SUFFIX) else Corpus(path)
+    return _opened[path][1]
+
+def key_range(path:str,start:int,stop:int)->list[int]:
+    puzzles = open_file(path)
+    return [key_of(puzzles[i]) for i in range(start,stop)]
+
+def keys(path:str,workers:Optional[int]=None,chunk_size:int=256)->Iterator[int]:
+    """ The keys of all puzzles of a file in order, computed on a process pool """
+    count = len(open_file(path))
+    if workers == 1:
+        for start in range(0,count,chunk_size):
+            yield from key_range(path,start,min(count,start+chunk_size))
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        starts = range(0,count,chunk_size)
+        for chunk in executor.map(key_range,[path]*len(starts),starts,[min(count,s+chunk_size) for s in starts]):
+            yield from chunk
+
+class Entry(NamedTuple):
+    source: int # number of the file in HashIndex.sources
+    index: int # index of the puzzle in its file
+
+class HashIndex:
+    """ A memory mapped hash table from canonical keys to the first puzzle that had them.
+    Layout: the header, then capacity keys (8 bytes, 0 is a free slot), sources and indices (4 bytes each).
+    The paths of the sources are kept next to it in <path>.sources, one per line """
+    def __init__(self,path:str,capacity:int=1<<16):
+        self.path = path
+        if not os.path.exists(path):
+            self._create(path,capacity)
+        self._map()
+        try:
+            with open(path+".sources") as f:
+                self.sources = f.read().splitlines()
+        except FileNotFoundError:
+            self.sources = []
+
+    @staticmethod
+    def _create(path:str,capacity:int):
+        with open(path,"wb") as f:
+            f.write(HEADER.pack(MAGIC,VERSION,capacity,0))
+            f.truncate(HEADER.size+16*capacity)
+
+    def _map(self):
+        with open(self.path,"r+b") as f:
+            self.mm = mmap.mmap(f.fileno(),0)
+        magic,version,self.capacity,self.count = HEADER.unpack_from(self.mm)
+        if magic != MAGIC or version != VERSION or len(self.mm) != HEADER.size+16*self.capacity:
+            self.mm.close()
+            raise ValueError(f"{self.path} is no hash index (version {VERSION})")
+        view = memoryview(self.mm)
+        end = HEADER.size+8*self.capacity
+        self.keys = view[HEADER.size:end].cast("Q")
+        self.entry_sources = view[end:end+4*self.capacity].cast("I")
+        self.entry_indices = view[end+4*self.capacity:].cast("I")
+
+    def _unmap(self):
+        HEADER.pack_into(self.mm,0,MAGIC,VERSION,self.capacity,self.count)
+        for view in (self.keys,self.entry_sources,self.entry_indices):
+            view.release()
+        self.mm.close()
+
+    def source(self,path:str)->int:
+        """ The number of a file, new files are appended """
+        path = os.path.normpath(path)
+        if path not in self.sources:
+            self.sources.append(path)
+        return self.sources.index(path)
+
+    def _slot(self,key:int)->int:
+        """ The slot of key or the free slot it would go into """
+        mask = self.capacity-1
+        slot = key & mask
+        while self.keys[slot] and self.keys[slot] != key:
+            slot = (slot+1) & mask
+        return slot
+
+    def get(self,key:int)->Optional[Entry]:
+        slot = self._slot(key)
+        return Entry(self.entry_sources[slot],self.entry_indices[slot]) if self.keys[slot] else None
+
+    def add(self,key:int,entry:Entry)->Optional[Entry]:
+        """ Stores entry under key unless the key is taken. Returns the entry that had it first or None """
+        slot = self._slot(key)
+        if self.keys[slot]:
+            return Entry(self.entry_sources[slot],self.entry_indices[slot])
+        self.keys[slot] = key
+        self.entry_sources[slot],self.entry_indices[slot] = entry
+        self.count += 1
+        if 2*self.count > self.capacity:
+            self._grow()
+        return None
+
+    def replace(self,key:int,entry:Entry)->None:
+        """ Points a stored key to another entry """
+        slot = self._slot(key)
+        assert self.keys[slot] == key
+        self.entry_sources[slot],self.entry_indices[slot] = entry
+
+    def _grow(self):
+        """ Moves all entries into a table of twice the capacity (keeps the load under 1/2) """
+        tmp_path = self.path+".tmp"
+        self._create(tmp_path,2*self.capacity)
+        old = [(key,self.entry_sources[slot],self.entry_indices[slot]) for slot,key in enumerate(self.keys) if key]
+        self._unmap()
+        os.replace(tmp_path,self.path)
+        self._map()
+        for key,source,index in old:
+            slot = self._slot(key)
+            self.keys[slot] = key
+            self.entry_sources[slot],self.entry_indices[slot] = source,index
+        self.count = len(old)
+
+    def __len__(self)->int:
+        return self.count
+
+    def close(self):
+        self._unmap()
+        with open(self.path+".sources","w") as f:
+            f.write("".join(path+"\n" for path in self.sources))
+
+    def __enter__(self):
+        return self
+    def __exit__(self,*_):
+        self.close()
+
+class Duplicate(NamedTuple):
+    index: int # of the duplicate in its file
+    first: Entry # the equivalent puzzle that came first
+
+def find_duplicates(index:HashIndex,path:str,workers:Optional[int]=None,renumber:bool=False)->tuple[int,list[Duplicate]]:
+    """ Adds the puzzles of a file to the index and returns the number of puzzles and the duplicates among them.
+    Puzzles the index already has from this very file (an earlier run) are no duplicates.
+    With renumber all kept puzzles of the file, also the ones of earlier runs, are indexed by their position
+    in the file without the duplicates, which is where they are once remove_puzzles rewrote it """
+    source = index.source(path)
+    duplicates = []
+    count = kept = 0
+    for i,key in enumerate(keys(path,workers)):
+        count += 1
+        if not key: # malformed, batch_validate.py reports those
+            kept += 1
+            continue
+        first = index.add(key,Entry(source,kept if renumber else i))
+        if first is None:
+            kept += 1
+        elif first == (source,i):
+            if renumber and kept != i: # an earlier run without removals indexed it where it is now
+                index.replace(key,Entry(source,kept))
+            kept += 1
+        else:
+            duplicates.append(Duplicate(i,first))
+    return count,duplicates
+
+def remove_puzzles(path:str,drop:set[int])->None:
+    """ Rewrites a puzzle file without the puzzles of the indices in drop (atomically) """
+    tmp_path = path+".tmp"
+    if path.endswith(SUFFIX):
+        reader = PuzzleStoreReader(path)
+        with PuzzleStoreWriter(tmp_path,reader.difficulty,reader.has_solutions) as writer:
+            for i in range(len(reader)):
+                if i not in drop:
+                    writer.write(reader.puzzle(i),reader.solution(i))
+        reader.close()
+    else:
+        i = 0
+        with open(path,"rb") as src, open(tmp_path,"wb") as dst:
+            for line in src:
+                if line.strip() and not line.startswith(b"#"): # a puzzle line like in Corpus
+                    i += 1
+                    if i-1 in drop: continue
+                dst.write(line)
+    os.replace(tmp_path,path)
+
+def main():
+    parser = ArgumentParser(description="Reports (or removes) puzzles that are equivalent to an earlier one, within and across files")
+    parser.add_argument("paths",nargs="+",help="text puzzle files or puzzle stores, earlier files win")
+    parser.add_argument("-i","--index",help="hash index to keep between runs (a temporary one by default)")
+    parser.add_argument("-j","--workers",type=int,help="number of processes (defaults to the number of cores)")
+    parser.add_argument("-r","--remove",action="store_true",help="rewrite the files without their duplicates")
+    parser.add_argument("-n","--show",type=int,default=5,help="duplicates to list per file")
+    args = parser.parse_args()
+    index_path = args.index or f"dedupe-{os.getpid()}.sddx"
+    total = 0
+    start = time.perf_counter()
+    try:
+        with HashIndex(index_path) as index:
+            for path in args.paths:
+                count,duplicates = find_duplicates(index,path,args.workers,renumber=args.remove)
+                total += count
+                print(f"{path}: {count} puzzles, {len(duplicates)} duplicates")
+                for duplicate in duplicates[:args.show]:
+                    first = duplicate.first
+                    print(f"  #{duplicate.index} is #{first.index} of {index.sources[first.source]}")
+                if args.remove and duplicates:
+                    remove_puzzles(path,{duplicate.index for duplicate in duplicates})
+                    if not path.endswith(SUFFIX) and os.path.exists(path+SUFFIX):
+                        print(f"  {path+SUFFIX} still has the duplicates, convert it again",file=sys.stderr)
+    finally:
+        if not args.index:
+            for name in (index_path,index_path+".sources"):
+                if os.path.exists(name): os.remove(name)
+    elapsed = time.perf_counter()-start
+    print(f"{total} puzzles in {elapsed:.2f}s ({total/elapsed:.0f} puzzles/s)",file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
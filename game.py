@@ -1,32 +1,73 @@
 import pygame as pg
+from pygame.event import Event
+from argparse import ArgumentParser
+from Profiler import Profiler
 from StateManager import StateManager as SM
 from States import *
+from typing import Callable, Optional
 
-pg.init()
+size = width, height = 1200, 1000
 
-pg.display.set_caption("Sudoku")
+def create_manager(profiler:Optional[Profiler]=None)->SM:
+    """ The state manager of the game. Needs an initialized display """
+    return SM({
+        "menu":MainMenuState(),
+        "play":PlayState(),
+        "pause":PauseState()
+    },start="menu",profiler=profiler)
 
-size = width, height = 1200, 1000
+def dispatch(sm:SM, events:list[Event])->bool:
+    """ Routes the events to the manager and returns False once the game should quit """
+    running = True
+    for event in events:
+        if event.type == pg.QUIT: running=False
+        elif event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
+            running=False
+        else:
+            sm.handle_event(event)
+    return running
 
-SCREEN = pg.display.set_mode(size,depth=32)
+def draw_frame(sm:SM, screen:pg.surface.Surface)->bool:
+    """ Draws what changed since the last frame and returns whether anything was drawn """
+    rects = sm.dirty_rects()
+    if rects is None:
+        screen.fill(pg.color.Color("white"))
+        sm.draw(screen)
+        pg.display.flip()
+    elif rects: # only parts changed, the rest of the screen still shows the last frame
+        sm.draw(screen)
+        pg.display.update(rects)
+    return rects is None or bool(rects)
 
-sm = SM({
-    "menu":MainMenuState(),
-    "play":PlayState(),
-    "pause":PauseState()
-},start="menu")
+def run(sm:SM, screen:pg.surface.Surface, on_frame:Optional[Callable[[int,list[Event]],None]]=None):
+    """ The game loop. on_frame gets the delta time and the events of every frame before they are handled """
+    clock = pg.time.Clock()
+    running=True
+    while running:
+        #updating
+        dt = clock.tick(60) #ms
+        events = pg.event.get()
+        if not events and not sm.animating():
+            events = [pg.event.wait(500)] # nothing to do until the next input (the timeout is just a safety net)
+        if on_frame is not None:
+            on_frame(dt,events)
+        running = dispatch(sm,events)
+        sm.update(dt)
+        #drawing
+        draw_frame(sm,screen)
 
-clock = pg.time.Clock()
-running=True
-while running:
-    #updating
-    dt = clock.tick(60) #ms
-    for event in pg.event.get():
-        if event.type == pg.QUIT: running=False
-        if event.type == pg.KEYDOWN:
-            if event.key == pg.K_ESCAPE:
-                running=False
-    #drawing     
-    SCREEN.fill(pg.color.Color("white"))
-    sm(dt,SCREEN)
-    pg.display.flip()
+def main():
+    parser = ArgumentParser(description="Sudoku")
+    parser.add_argument("--profile",nargs="?",const="",metavar="TRACE",
+        help="show the frame rate and frame times and write a Chrome trace to TRACE on exit")
+    args = parser.parse_args()
+    profiler = None if args.profile is None else Profiler(overlay=True)
+    pg.init()
+    pg.display.set_caption("Sudoku")
+    screen = pg.display.set_mode(size,depth=32)
+    run(create_manager(profiler),screen)
+    if profiler is not None and args.profile:
+        profiler.export_chrome_trace(args.profile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Replays recorded input traces through the game without a display and reports frame times.
+
+    py headless.py record session.trace                  # play in a window and record the input
+    py headless.py replay session.trace -o frames.csv    # replay on the SDL dummy driver
+    py headless.py replay session.trace --chrome-trace trace.json  # plus state, loading and transition timings
+
+A trace is a header (magic, version, event count) followed by 16 byte records:
+the trace time in ms, the event kind and its mouse/key data.
+The trace clock stands still while a state is loading, so a replay hands every event to the same state
+as the recording, however fast the machine loads. Replays run as fast as possible unless --realtime is given."""
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT","1")
+import random
+import struct
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from array import array
+from typing import BinaryIO, NamedTuple, Optional, TextIO
+import pygame as pg
+from pygame.event import Event
+import game
+from Profiler import Profiler, percentile
+from States import PlayState
+
+HEADER = struct.Struct("<4sBxxxI") # magic, version, count
+RECORD = struct.Struct("<IBBhhIH") # time in ms, kind, mouse button(s), x, y, key, mod
+MAGIC = b"STRC"
+VERSION = 1
+
+# event kinds in the trace, the pygame event type constants are not stable across SDL versions
+KINDS = {pg.KEYDOWN:1, pg.KEYUP:2, pg.MOUSEBUTTONDOWN:3, pg.MOUSEBUTTONUP:4, pg.MOUSEMOTION:5, pg.QUIT:6}
+EVENT_TYPES = {kind:t for t,kind in KINDS.items()}
+
+def encode(ms:int,event:Event)->Optional[bytes]:
+    """ The record of an event or None if the event kind isn't traced """
+    kind = KINDS.get(event.type)
+    if kind is None: return None
+    x,y = getattr(event,"pos",(0,0))
+    if event.type == pg.MOUSEMOTION:
+        buttons = sum(1<<i for i,pressed in enumerate(event.buttons) if pressed)
+    else:
+        buttons = getattr(event,"button",0)
+    return RECORD.pack(ms,kind,buttons,x,y,getattr(event,"key",0),getattr(event,"mod",0))
+
+def decode(record:bytes)->tuple[int,Event]:
+    """ Inverse of encode """
+    ms,kind,buttons,x,y,key,mod = RECORD.unpack(record)
+    t = EVENT_TYPES[kind]
+    if t in (pg.KEYDOWN,pg.KEYUP):
+        return ms,Event(t,key=key,mod=mod)
+    if t in (pg.MOUSEBUTTONDOWN,pg.MOUSEBUTTONUP):
+        return ms,Event(t,pos=(x,y),button=buttons)
+    if t == pg.MOUSEMOTION:
+        return ms,Event(t,pos=(x,y),rel=(0,0),buttons=tuple(bool(buttons>>i & 1) for i in range(3)))
+    return ms,Event(t)
+
+class TraceWriter:
+    """ Streams events into a trace file. The header is completed on close. Use it as a context manager """
+    def __init__(self,path:str):
+        self.path = path
+        self.count = 0
+        self.file: BinaryIO = open(path,"wb")
+        self.file.write(bytes(HEADER.size))
+    def write(self,ms:int,event:Event):
+        record = encode(ms,event)
+        if record is not None:
+            self.file.write(record)
+            self.count += 1
+    def close(self):
+        if not self.file.closed:
+            self.file.seek(0)
+            self.file.write(HEADER.pack(MAGIC,VERSION,self.count))
+            self.file.close()
+    def __enter__(self):
+        return self
+    def __exit__(self,*_):
+        self.close()
+
+def read_trace(path:str)->list[tuple[int,Event]]:
+    """ The (time in ms, event) pairs of a trace in recording order """
+    with open(path,"rb") as f:
+        data = f.read()
+    magic,version,count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is no input trace (version {VERSION})")
+    if len(data) != HEADER.size + count*RECORD.size:
+        raise ValueError(f"{path} is truncated")
+    return [decode(data[start:start+RECORD.size]) for start in range(HEADER.size,len(data),RECORD.size)]
+
+class Frame(NamedTuple):
+    time: float # trace time in ms
+    state: str # the current state or "loading"
+    events: int
+    update_ms: float # handling the events and updating
+    draw_ms: float
+    drawn: bool # whether anything had to be drawn
+
+def record(path:str,seed:Optional[int]=None)->int:
+    """ Runs the game in a window and records its input into path. Returns the number of recorded events """
+    random.seed(seed)
+    pg.init()
+    pg.display.set_caption("Sudoku (recording)")
+    screen = pg.display.set_mode(game.size,depth=32)
+    sm = game.create_manager()
+    trace_time = 0
+    with TraceWriter(path) as writer:
+        def on_frame(dt:int,events:list[Event]):
+            nonlocal trace_time
+            if not sm.is_loading():
+                trace_time += dt
+            for event in events:
+                writer.write(trace_time,event)
+        game.run(sm,screen,on_frame)
+        return writer.count
+
+def replay(trace:list[tuple[int,Event]],realtime:bool=False,fps:int=60,seed:Optional[int]=None,profiler:Optional[Profiler]=None)->list[Frame]:
+    """ Replays the trace on a fresh game and returns the frame times. Runs until the trace is done and nothing is loading anymore.
+    A profiler additionally times the states and their loading """
+    random.seed(seed)
+    # a saved game would add the continue button to the menu, so replays never see or touch the real save
+    PlayState.save_path = os.path.join(tempfile.mkdtemp(prefix="sudoku-replay-"),"autosave.sdsv")
+    screen = pg.display.set_mode(game.size,depth=32)
+    sm = game.create_manager(profiler)
+    clock = pg.time.Clock()
+    frames: list[Frame] = []
+    trace_time = 0
+    i = 0
+    running = True
+    while running and (i < len(trace) or sm.is_loading()):
+        dt = clock.tick(fps) if realtime else 1000//fps
+        loading = sm.is_loading()
+        if loading:
+            if not realtime:
+                time.sleep(0.001) # give the loading thread the GIL instead of spinning
+        else:
+            trace_time += dt
+        events = []
+        while i < len(trace) and trace[i][0] <= trace_time:
+            events.append(trace[i][1])
+            i += 1
+        state = "loading" if loading else sm.current_state_str()
+        start = time.perf_counter()
+        running = game.dispatch(sm,events)
+        sm.update(dt)
+        mid = time.perf_counter()
+        drawn = game.draw_frame(sm,screen)
+        end = time.perf_counter()
+        frames.append(Frame(trace_time,state,len(events),(mid-start)*1000,(end-mid)*1000,drawn))
+    return frames
+
+def summary(frames:list[Frame])->dict[str,dict[str,float]]:
+    """ Frame count and update/draw statistics (mean, p50, p95, max in ms) per state """
+    result: dict[str,dict[str,float]] = {}
+    for state in dict.fromkeys(frame.state for frame in frames):
+        own = [frame for frame in frames if frame.state == state]
+        stats: dict[str,float] = {"frames": len(own), "drawn": sum(frame.drawn for frame in own)}
+        for name in ("update_ms","draw_ms"):
+            values = array("d",sorted(getattr(frame,name) for frame in own))
+            prefix = name.removesuffix("_ms")
+            stats[f"{prefix}_mean_ms"] = sum(values)/len(values)
+            stats[f"{prefix}_p50_ms"] = percentile(values,0.5)
+            stats[f"{prefix}_p95_ms"] = percentile(values,0.95)
+            stats[f"{prefix}_max_ms"] = values[-1]
+        result[state] = stats
+    return result
+
+def write_frames(frames:list[Frame],out:TextIO):
+    out.write("frame,"+",".join(Frame._fields)+"\n")
+    for n,frame in enumerate(frames):
+        out.write(f"{n},{frame.time:.1f},{frame.state},{frame.events},{frame.update_ms:.4f},{frame.draw_ms:.4f},{int(frame.drawn)}\n")
+
+def main():
+    parser = ArgumentParser(description="Records input traces of the game and replays them headless to measure frame times")
+    sub = parser.add_subparsers(dest="command",required=True)
+    rec = sub.add_parser("record",help="play in a window and record the input")
+    rec.add_argument("trace")
+    rec.add_argument("-s","--seed",type=int,default=0,help="seed of the puzzle choice, use the same one for the replay")
+    rep = sub.add_parser("replay",help="replay a trace on the SDL dummy driver")
+    rep.add_argument("trace")
+    rep.add_argument("-o","--output",help="csv file for the per frame breakdown")
+    rep.add_argument("-s","--seed",type=int,default=0,help="seed of the puzzle choice")
+    rep.add_argument("--realtime",action="store_true",help="run at the frame rate instead of as fast as possible")
+    rep.add_argument("--fps",type=int,default=60)
+    rep.add_argument("--chrome-trace",metavar="PATH",help="json file for chrome://tracing with the state, loading and transition timings")
+    args = parser.parse_args()
+    if args.command == "record":
+        count = record(args.trace,args.seed)
+        print(f"recorded {count} events into {args.trace}")
+        return
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pg.init()
+    trace = read_trace(args.trace)
+    start = time.perf_counter()
+    profiler = Profiler() if args.chrome_trace else None
+    frames = replay(trace,args.realtime,args.fps,args.seed,profiler)
+    elapsed = time.perf_counter()-start
+    if args.output:
+        with open(args.output,"w") as f:
+            write_frames(frames,f)
+    if profiler is not None:
+        profiler.export_chrome_trace(args.chrome_trace)
+    print(f"{len(trace)} events, {len(frames)} frames in {elapsed:.2f}s",file=sys.stderr)
+    for state,stats in summary(frames).items():
+        print(f"{state:>8}: {stats['frames']:6.0f} frames ({stats['drawn']:.0f} drawn)  "
+            f"update mean {stats['update_mean_ms']:.3f} p95 {stats['update_p95_ms']:.3f} max {stats['update_max_ms']:.3f} ms  "
+            f"draw mean {stats['draw_mean_ms']:.3f} p95 {stats['draw_p95_ms']:.3f} max {stats['draw_max_ms']:.3f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -35,14 +35,14 @@ def construct_puzzle_solution():
             for i in range(9):
                 for j in range(9):
                     # pick a number for cell (i,j) from the set of remaining available numbers
-                    choices = rows[i].intersection(columns[j]).intersection(squares[(i/3)*3 + j/3])
+                    choices = rows[i].intersection(columns[j]).intersection(squares[(i//3)*3 + j//3])
                     choice  = random.choice(list(choices))
         
                     puzzle[i][j] = choice
         
                     rows[i].discard(choice)
                     columns[j].discard(choice)
-                    squares[(i/3)*3 + j/3].discard(choice)
+                    squares[(i//3)*3 + j//3].discard(choice)
 
             # success! every cell is filled.
             return puzzle
@@ -63,15 +63,15 @@ def pluck(puzzle, n=0):
     Answers the question: can the cell (i,j) in the puzzle "puz" contain the number
     in cell "c"? """
     def canBeA(puz, i, j, c):
-        v = puz[c/9][c%9]
+        v = puz[c//9][c%9]
         if puz[i][j] == v: return True
         if puz[i][j] in range(1,10): return False
             
         for m in range(9): # test row, col, square
             # if not the cell itself, and the mth cell of the group contains the value v, then "no"
-            if not (m==c/9 and j==c%9) and puz[m][j] == v: return False
-            if not (i==c/9 and m==c%9) and puz[i][m] == v: return False
-            if not ((i/3)*3 + m/3==c/9 and (j/3)*3 + m%3==c%9) and puz[(i/3)*3 + m/3][(j/3)*3 + m%3] == v:
+            if not (m==c//9 and j==c%9) and puz[m][j] == v: return False
+            if not (i==c//9 and m==c%9) and puz[i][m] == v: return False
+            if not ((i//3)*3 + m//3==c//9 and (j//3)*3 + m%3==c%9) and puz[(i//3)*3 + m//3][(j//3)*3 + m%3] == v:
                 return False
 
         return True
@@ -93,18 +93,18 @@ def pluck(puzzle, n=0):
         row = col = square = False
 
         for i in range(9):
-            if i != cell/9:
+            if i != cell//9:
                 if canBeA(puzzle, i, cell%9, cell): row = True
             if i != cell%9:
-                if canBeA(puzzle, cell/9, i, cell): col = True
-            if not (((cell/9)/3)*3 + i/3 == cell/9 and ((cell/9)%3)*3 + i%3 == cell%9):
-                if canBeA(puzzle, ((cell/9)/3)*3 + i/3, ((cell/9)%3)*3 + i%3, cell): square = True
+                if canBeA(puzzle, cell//9, i, cell): col = True
+            if not (((cell//9)//3)*3 + i//3 == cell//9 and ((cell//9)%3)*3 + i%3 == cell%9):
+                if canBeA(puzzle, ((cell//9)//3)*3 + i//3, ((cell//9)%3)*3 + i%3, cell): square = True
 
         if row and col and square:
             continue # could not pluck this cell, try again.
         else:
             # this is a pluckable cell!
-            puzzle[cell/9][cell%9] = 0 # 0 denotes a blank cell
+            puzzle[cell//9][cell%9] = 0 # 0 denotes a blank cell
             cells.discard(cell) # remove from the set of visible cells (pluck it)
             # we don't need to reset "cellsleft" because if a cell was not pluckable
             # earlier, then it will still not be pluckable now (with less information
@@ -159,7 +159,8 @@ def display(puzzle):
         print (' '.join([str(n or '_') for n in row]))
 
 
-""" Controls starts here """
-results = run(n=0)       # find puzzles with as few givens as possible.
-puzzle  = best(results)  # use the best one of those puzzles.
-display(puzzle)          # display that puzzle.
\ No newline at end of file
+""" Controls starts here (the importable, faster generator lives in Generator.py) """
+if __name__ == "__main__":
+    results = run(n=0)       # find puzzles with as few givens as possible.
+    puzzle  = best(results)  # use the best one of those puzzles.
+    display(puzzle)          # display that puzzle.
\ No newline at end of file